@@ -0,0 +1,314 @@
+"""
+filters_effects 性能基准测试
+对每个公开的滤镜函数，在 1/12/48 百万像素、L/RGB/RGBA 三种模式下
+记录延迟中位数、p95 延迟和峰值内存，并与保存的 JSON 基线对比，退化时以非零状态退出
+
+输入图像全部由固定随机种子合成，无需网络或外部图片。
+峰值内存在每个用例独立的子进程中测量（包含 Pillow C 层的分配）。
+仓库中提交了 1 百万像素档位的基线；基线文件不存在时以非零状态退出（--update 除外），
+其他档位没有基线的用例显示为 n/a
+
+用法:
+    python benchmarks/bench_filters.py                      # 全量运行并与基线对比
+    python benchmarks/bench_filters.py --sizes 1 --modes RGB
+    python benchmarks/bench_filters.py --only apply_blur apply_convolution
+    python benchmarks/bench_filters.py --update             # 把本次结果写为新基线
+"""
+
+import argparse
+import contextlib
+import gc
+import inspect
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import filters_effects
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "baselines", "filters_effects.json")
+
+# 百万像素数 -> (宽, 高)，保持 4:3
+SIZES = {
+    1: (1155, 866),
+    12: (4000, 3000),
+    48: (8000, 6000),
+}
+MODES = ('L', 'RGB', 'RGBA')
+
+# 每个公开函数的基准参数（不含img）；新增公开函数时必须在这里登记
+CASES = {
+    'apply_blur': dict(radius=2),
+    'apply_box_blur': dict(radius=2),
+    'apply_sharpen': {},
+    'apply_edge_enhance': {},
+    'apply_find_edges': {},
+    'apply_contour': {},
+    'apply_emboss': {},
+    'apply_detail': {},
+    'adjust_brightness': dict(factor=1.5),
+    'adjust_contrast': dict(factor=1.5),
+    'adjust_saturation': dict(factor=1.5),
+    'adjust_sharpness': dict(factor=2.0),
+    'apply_smooth': {},
+    'apply_smooth_more': {},
+    'apply_median_filter': dict(size=3),
+    'apply_min_filter': dict(size=3),
+    'apply_max_filter': dict(size=3),
+    'apply_unsharp_mask': dict(radius=2, percent=150, threshold=3),
+    'apply_convolution': dict(kernel=filters_effects.create_disk_kernel(15)),
+    'apply_motion_blur': dict(length=31, angle=30),
+    'apply_lens_blur': dict(radius=15),
+    'apply_bilateral_filter': dict(radius=5, sigma_color=30),
+    'apply_guided_filter': dict(radius=8, eps=0.01),
+}
+
+# 不以图像为输入的公开函数（生成卷积核），不参与图像基准
+NON_IMAGE_FUNCTIONS = {'create_motion_kernel', 'create_disk_kernel'}
+
+
+def public_functions():
+    """列出 filters_effects 中所有公开函数，未登记的函数直接报错"""
+    names = sorted(
+        name for name, obj in inspect.getmembers(filters_effects, inspect.isfunction)
+        if not name.startswith('_') and obj.__module__ == filters_effects.__name__
+    )
+    missing = [name for name in names if name not in CASES and name not in NON_IMAGE_FUNCTIONS]
+    if missing:
+        raise RuntimeError(f"以下公开函数没有基准参数，请在 CASES 中登记: {missing}")
+    return [name for name in names if name in CASES]
+
+
+def make_input(megapixels, mode, seed=0):
+    """合成确定性的测试图像：平滑渐变叠加随机噪声，RGBA 带渐变透明度"""
+    width, height = SIZES[megapixels]
+    rng = np.random.default_rng(seed)
+    ramp_x = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :]
+    ramp_y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    base = np.empty((height, width, 3), dtype=np.uint8)
+    base[:, :, 0] = (ramp_x * 0.7 + ramp_y * 0.3).astype(np.uint8)
+    base[:, :, 1] = (ramp_y * 0.8).astype(np.uint8)
+    base[:, :, 2] = 128
+    noise = rng.integers(0, 32, size=base.shape, dtype=np.uint8)
+    np.add(base, noise, out=base, casting='unsafe')
+    img = Image.fromarray(base, 'RGB')
+    if mode == 'L':
+        return img.convert('L')
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').resize((width, height)))
+    return img
+
+
+def _read_status_kb(field):
+    """从 /proc/self/status 读取内存字段（KB），非 Linux 平台返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """把进程的 RSS 峰值 (VmHWM) 重置为当前 RSS（Linux 4.0+），成功返回 True"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure_peak_memory(name, megapixels, mode):
+    """
+    测量一次调用的峰值内存增量（字节），在独立的子进程中执行
+    
+    Pillow 的 C 层内存不经过 tracemalloc，而同一进程里预热和计时之后
+    RSS 峰值早已达到，因此每个用例都在新进程中只调用一次：
+    生成输入后重置 RSS 峰值，调用结束读取峰值与调用前 RSS 的差。
+    无法重置峰值的平台退回到 ru_maxrss 的增量（输入生成的临时内存可能使结果偏小），
+    Windows 上只有 tracemalloc 的统计
+    """
+    code = ("import sys; sys.path.insert(0, {here!r}); import bench_filters as b; "
+            "print(b._child_peak_memory({name!r}, {mp}, {mode!r}))").format(
+        here=os.path.dirname(os.path.abspath(__file__)), name=name, mp=megapixels, mode=mode)
+    # 固定 glibc 的 mmap 阈值：大块内存释放后立即归还系统，
+    # 否则生成输入时释放的临时内存仍驻留，调用中复用它们不会增加 RSS
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_='131072', MALLOC_TRIM_THRESHOLD_='131072')
+    output = subprocess.run([sys.executable, '-c', code], check=True, env=env,
+                            capture_output=True, text=True).stdout
+    return int(output.strip().splitlines()[-1])
+
+
+def _child_peak_memory(name, megapixels, mode):
+    func = getattr(filters_effects, name)
+    img = make_input(megapixels, mode)
+    gc.collect()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if _reset_peak_rss():
+            start = _read_status_kb('VmRSS')
+            tracemalloc.start()
+            func(img, **CASES[name])
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_peak = (_read_status_kb('VmHWM') - start) * 1024
+        elif resource is not None:
+            start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            tracemalloc.start()
+            func(img, **CASES[name])
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            # ru_maxrss 在 Linux 上以 KB 为单位，macOS 上以字节为单位
+            unit = 1 if sys.platform == 'darwin' else 1024
+            rss_peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start) * unit
+        else:
+            tracemalloc.start()
+            func(img, **CASES[name])
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_peak = 0
+    return max(traced_peak, rss_peak)
+
+
+def run_case(name, img, repeat, megapixels, mode):
+    """对单个函数计时 repeat 次（先预热一次），峰值内存在独立子进程中单独测量"""
+    func = getattr(filters_effects, name)
+    kwargs = CASES[name]
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(img, **kwargs)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(img, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000.0)
+    peak = measure_peak_memory(name, megapixels, mode)
+    return {
+        'median_ms': round(float(np.median(timings)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'peak_mb': round(peak / 2 ** 20, 2),
+        'repeat': repeat,
+    }
+
+
+def _format_change(base, value, unit):
+    """格式化 基线 -> 本次 的变化，基线缺失时显示 n/a 而不是 0"""
+    if base is None:
+        return f"n/a -> {value}{unit}"
+    if base == 0:
+        return f"{base}{unit} -> {value}{unit}"
+    return f"{base}{unit} -> {value}{unit} ({(value - base) / base:+.0%})"
+
+
+def compare(results, baselines, time_tolerance, memory_tolerance):
+    """与基线对比，打印每个用例的变化，返回退化条目列表（缺失的基线项不参与判断）"""
+    regressions = []
+    for key, result in results.items():
+        base = baselines.get(key) or {}
+        base_ms, base_mb = base.get('median_ms'), base.get('peak_mb')
+        print(f"{key:<45} 中位数 {_format_change(base_ms, result['median_ms'], 'ms'):<32} "
+              f"峰值 {_format_change(base_mb, result['peak_mb'], 'MB')}")
+        if base_ms is not None and result['median_ms'] > base_ms * (1 + time_tolerance):
+            regressions.append(f"{key}: 中位数 {base_ms}ms -> {result['median_ms']}ms")
+        # 峰值内存允许 1MB 的采样抖动
+        if base_mb is not None and result['peak_mb'] > base_mb * (1 + memory_tolerance) + 1.0:
+            regressions.append(f"{key}: 峰值内存 {base_mb}MB -> {result['peak_mb']}MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="filters_effects 性能基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=sorted(SIZES),
+                        choices=sorted(SIZES), help="百万像素档位")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    parser.add_argument('--only', nargs='+', help="只运行指定的函数")
+    parser.add_argument('--repeat', type=int, default=5, help="每个用例的计时次数")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线 JSON 路径")
+    parser.add_argument('--update', action='store_true', help="把本次结果合并写入基线")
+    parser.add_argument('--output', help="把本次结果另存为 JSON")
+    parser.add_argument('--time-tolerance', type=float, default=0.25,
+                        help="允许的延迟中位数增幅（比例）")
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help="允许的峰值内存增幅（比例）")
+    args = parser.parse_args(argv)
+    
+    names = public_functions()
+    if args.only:
+        unknown = set(args.only) - set(names)
+        if unknown:
+            parser.error(f"未知函数: {sorted(unknown)}")
+        names = [name for name in names if name in args.only]
+    
+    print("=" * 60)
+    print("  filters_effects 性能基准测试")
+    print("=" * 60 + "\n")
+    
+    results = {}
+    for megapixels in args.sizes:
+        for mode in args.modes:
+            img = make_input(megapixels, mode)
+            for name in names:
+                key = f"{name}|{megapixels}MP|{mode}"
+                results[key] = run_case(name, img, args.repeat, megapixels, mode)
+                r = results[key]
+                print(f"{key:<45} 中位数 {r['median_ms']:>10.1f}ms  "
+                      f"p95 {r['p95_ms']:>10.1f}ms  峰值 {r['peak_mb']:>8.1f}MB")
+            del img
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)
+    
+    if args.update:
+        baselines.update(results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f"\n已更新基线: {args.baseline}")
+        return 0
+    
+    if not baselines:
+        # 没有基线就无法判断退化，不能静默通过
+        print(f"\n✗ 未找到基线 {args.baseline}，请先使用 --update 生成")
+        return 2
+    
+    missing = [key for key in results if key not in baselines]
+    if missing:
+        print(f"\n{len(missing)} 个用例没有基线（显示为 n/a），未参与对比")
+    print("\n与基线对比:")
+    regressions = compare(results, baselines, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\n" + "!" * 60)
+        print(f"  性能退化: {len(regressions)} 项")
+        print("!" * 60)
+        for line in regressions:
+            print(f"  ✗ {line}")
+        return 1
+    
+    print("\n✓ 所有用例均未超出基线容差")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -235,6 +235,23 @@ def main():
     
     basic_operations.save_image(chart, "output/examples/simple_chart.png")
     
+    # 8. 批量绘图 - 整个网格只复制一次画布
+    print("\n8. 使用 Canvas 批量绘图")
+    commands = [
+        {'shape': 'line', 'start': (x, 0), 'end': (x, 400), 'fill': (200, 200, 200)}
+        for x in range(0, 600, 50)
+    ] + [
+        {'shape': 'line', 'start': (0, y), 'end': (600, y), 'fill': (200, 200, 200)}
+        for y in range(0, 400, 50)
+    ]
+    img_batch = drawing.draw_shapes(canvas, commands)
+    
+    # 也可以链式调用，in_place=True 时直接在图上绘制
+    drawing.Canvas(img_batch, in_place=True) \
+        .circle((300, 200), 100, outline=(255, 0, 0), width=3) \
+        .text((240, 190), "Canvas API", font_size=24)
+    basic_operations.save_image(img_batch, "output/examples/canvas_batch.png")
+    
     print("\n" + "=" * 60)
     print("  ✓ 绘图功能示例完成！")
     print("  查看 output/examples/ 目录")
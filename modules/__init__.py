@@ -10,6 +10,9 @@ __all__ = [
     'color_operations',
     'composition',
     'text_operations',
-    'advanced'
+    'advanced',
+    'streaming',
+    'scene_graph',
+    'tiled_drawing'
 ]
 
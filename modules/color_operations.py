@@ -3,7 +3,15 @@
 包含灰度转换、颜色模式转换、颜色分离合并等功能
 """
 
-from PIL import Image, ImageOps
+import hashlib
+import io
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageChops, ImageCms, ImageFilter, ImageOps
 
 
 def convert_to_grayscale(img):
@@ -109,6 +117,127 @@ def autocontrast(img, cutoff=0):
     return ImageOps.autocontrast(img, cutoff=cutoff)
 
 
+def _tile_bounds(length, count):
+    """
+    与 np.array_split 相同的切分：每块 length // count 个像素，余数分给前面的分块，
+    分块大小最多相差 1（分块数不超过长度）
+    
+    返回:
+        count + 1 个边界
+    """
+    count = max(1, min(count, length))
+    sizes = np.full(count, length // count)
+    sizes[:length % count] += 1
+    return np.concatenate(([0], np.cumsum(sizes)))
+
+
+def _clahe_luts(luma, grid, clip_limit):
+    """
+    计算每个分块的直方图并裁剪，返回 (分块行, 分块列, 256) 的 float32 映射表和行、列方向的分块边界
+    
+    分块直方图用 Pillow 的 histogram() 统计（C 实现，比拼接下标再整幅 bincount 快得多），
+    裁剪、重新分配和累加对所有分块一次完成
+    """
+    ys = _tile_bounds(luma.height, grid[1])
+    xs = _tile_bounds(luma.width, grid[0])
+    hist = np.array([luma.crop((left, top, right, bottom)).histogram()
+                     for top, bottom in zip(ys[:-1].tolist(), ys[1:].tolist())
+                     for left, right in zip(xs[:-1].tolist(), xs[1:].tolist())], dtype=np.float32)
+    hist = hist.reshape(len(ys) - 1, len(xs) - 1, 256)
+    area = hist.sum(axis=2, keepdims=True)
+    if clip_limit > 0:
+        # 超过上限的部分均匀分配到所有灰度级
+        limit = np.maximum(clip_limit * area / 256, 1)
+        excess = np.maximum(hist - limit, 0).sum(axis=2, keepdims=True)
+        np.minimum(hist, limit, out=hist)
+        hist += excess / 256
+    luts = np.cumsum(hist, axis=2)
+    luts *= 255 / np.maximum(area, 1)
+    return luts, ys, xs
+
+
+def _interpolation_segments(bounds):
+    """
+    把一个方向按相邻分块中心切成若干段（分块大小可以相差 1，中心不一定等距）
+    
+    返回:
+        [(起点, 终点, 前一分块, 后一分块, 后一分块的权重数组), ...]
+    """
+    count = len(bounds) - 1
+    centers = (bounds[:-1] + bounds[1:]) / 2
+    position = np.arange(bounds[-1]) + 0.5
+    # 第 k 段在第 k-1 和第 k 个分块中心之间；两端的段只用最近的分块
+    edges = [0, *np.searchsorted(position, centers).tolist(), len(position)]
+    segments = []
+    for k in range(count + 1):
+        start, end = edges[k], edges[k + 1]
+        if start == end:
+            continue
+        low, high = max(k - 1, 0), min(k, count - 1)
+        if high == low:
+            weight = np.zeros(end - start, dtype=np.float32)
+        else:
+            weight = (position[start:end] - centers[low]) / (centers[high] - centers[low])
+            weight = weight.astype(np.float32)
+        segments.append((start, end, low, high, weight))
+    return segments
+
+
+def apply_clahe(img, clip_limit=2.0, grid_size=(8, 8)):
+    """
+    限制对比度的自适应直方图均衡化（CLAHE）
+    
+    图像分成网格，每块单独均衡化并裁剪直方图以限制噪声放大，
+    每个像素的结果由相邻 4 个分块的映射表双线性插值得到，没有块状边界。
+    彩色图像只处理亮度（YCbCr 的 Y 通道），色度不变
+    
+    参数:
+        img: Image对象（L/RGB/RGBA，RGBA 的透明度保持不变，其他模式先转为 RGB）
+        clip_limit: 直方图裁剪上限（相对于平均每级像素数的倍数），0 表示不裁剪（普通自适应均衡化）
+        grid_size: 网格 (列数, 行数)
+    
+    返回:
+        处理后的图像
+    """
+    print(f"CLAHE: 裁剪上限 {clip_limit}, 网格 {grid_size[0]}x{grid_size[1]}")
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if img.mode == 'L':
+        luma = img
+    else:
+        ycbcr = img.convert('RGB').convert('YCbCr')
+        luma, cb, cr = ycbcr.split()
+    gray = np.asarray(luma)
+    luts, ys, xs = _clahe_luts(luma, grid_size, clip_limit)
+    
+    # 相邻 4 个分块中心之间的矩形区域共用同一组映射表。双线性插值写成
+    # a + wx*b + wy*(c + wx*d)，四张表并排成 (256, 4)，每个像素只需一次查表
+    out = np.empty(gray.shape, dtype=np.uint8)
+    column_segments = _interpolation_segments(xs)
+    for top, bottom, row0, row1, wy in _interpolation_segments(ys):
+        wy = wy[:, np.newaxis]
+        for left, right, col0, col1, wx in column_segments:
+            lut00, lut01 = luts[row0, col0], luts[row0, col1]
+            lut10, lut11 = luts[row1, col0], luts[row1, col1]
+            table = np.stack([lut00 + 0.5, lut01 - lut00, lut10 - lut00,
+                              lut11 - lut10 - lut01 + lut00], axis=1)
+            terms = table.take(gray[top:bottom, left:right], axis=0)
+            value = terms[..., 3] * wx
+            value += terms[..., 2]
+            value *= wy
+            value += terms[..., 0]
+            value += terms[..., 1] * wx
+            out[top:bottom, left:right] = value
+    
+    result = Image.fromarray(out, 'L')
+    if img.mode == 'L':
+        return result
+    rgb = Image.merge('YCbCr', (result, cb, cr)).convert('RGB')
+    if img.mode == 'RGBA':
+        rgb.putalpha(img.getchannel('A'))
+    return rgb
+
+
 def split_channels(img):
     """
     分离颜色通道
@@ -150,22 +279,186 @@ def adjust_gamma(img, gamma=1.0):
     
     参数:
         img: Image对象
-        gamma: 伽马值 (< 1.0 变亮, > 1.0 变暗)
+        gamma: 伽马值，按 输入^(1/gamma) 映射 (< 1.0 变暗, > 1.0 变亮)
     
     返回:
         校正后的图像
     """
     print(f"伽马校正: gamma = {gamma}")
-    inv_gamma = 1.0 / gamma
-    lut = [int(pow(i / 255.0, inv_gamma) * 255) for i in range(256)]
+    lut = list(_point_table('gamma', (gamma,))[0])
     
-    if img.mode == 'RGB':
-        return img.point(lambda i: lut[i])
-    elif img.mode == 'L':
-        return img.point(lut)
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    return img.point(lut * len(img.getbands()))
+
+
+def _color_box_mask(img_rgb, color, tolerance):
+    """
+    每个通道都落在 color ± tolerance 内的像素为 255，其余为 0
+    
+    每个通道先用查找表判断是否在容差范围内，再逐通道取最小值
+    """
+    lut = []
+    for target in color[:3]:
+        lut.extend(255 if abs(value - target) <= tolerance else 0 for value in range(256))
+    r, g, b = img_rgb.point(lut).split()
+    return ImageChops.darker(ImageChops.darker(r, g), b)
+
+
+@lru_cache(maxsize=256)
+def _point_table(name, args):
+    """
+    单个逐点操作的查找表，形状为 (1, 256) 或 (3, 256)（按 R, G, B 分别指定）
+    
+    与 adjust_gamma、posterize、solarize、invert_colors、
+    convert_to_black_and_white 使用的公式完全相同
+    """
+    values = np.arange(256)
+    if name == 'gamma':
+        inv_gamma = 1.0 / args[0]
+        table = [int(pow(i / 255.0, inv_gamma) * 255) for i in range(256)]
+    elif name == 'posterize':
+        table = values & ~(2 ** (8 - args[0]) - 1)
+    elif name == 'solarize':
+        table = np.where(values < args[0], values, 255 - values)
+    elif name == 'invert':
+        table = 255 - values
+    elif name == 'threshold':
+        table = np.where(values > args[0], 255, 0)
+    elif name == 'curve':
+        table = args
     else:
-        rgb_img = img.convert('RGB')
-        return rgb_img.point(lambda i: lut[i])
+        raise ValueError(f"未知的逐点操作: {name}")
+    table = np.asarray(table, dtype=np.intp).reshape(-1, 256)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=128)
+def _compile_point_steps(steps):
+    """把一串逐点操作合成为一张 (3, 256) 的查找表：lut = 后一步[前一步]"""
+    luts = np.tile(np.arange(256), (3, 1))
+    for name, args in steps:
+        table = _point_table(name, args)
+        luts = np.stack([table[min(c, len(table) - 1)][luts[c]] for c in range(3)])
+    return luts
+
+
+class PointPipeline:
+    """
+    惰性的逐点操作流水线
+    
+    每个操作只记录为一个步骤；apply() 时把所有步骤的 256 级查找表合成为一张，
+    用一次 img.point() 完成，例如 5 步的色调链只需遍历一次图像。
+    合成结果按步骤参数缓存，重复使用相同流水线时不再重新计算。
+    
+    grayscale() / black_and_white() 会先把图像转换为灰度，
+    它们前后的步骤各自合成，分别用一次 point() 完成。
+    
+    用法:
+        tone = PointPipeline().gamma(0.8).posterize(5).solarize(200)
+        result = tone.apply(img)
+    """
+    
+    def __init__(self, steps=()):
+        self.steps = tuple(steps)
+    
+    def __repr__(self):
+        return f"PointPipeline({list(self.steps)})"
+    
+    def _add(self, name, *args):
+        return PointPipeline(self.steps + ((name, args),))
+    
+    def gamma(self, gamma):
+        """伽马校正（与 adjust_gamma 相同）"""
+        return self._add('gamma', float(gamma))
+    
+    def posterize(self, bits):
+        """色调分离（与 posterize 相同）"""
+        return self._add('posterize', int(bits))
+    
+    def solarize(self, threshold=128):
+        """曝光过度（与 solarize 相同）"""
+        return self._add('solarize', int(threshold))
+    
+    def invert(self):
+        """反色（与 invert_colors 相同）"""
+        return self._add('invert')
+    
+    def threshold(self, threshold=128):
+        """二值化：大于阈值为 255，否则为 0"""
+        return self._add('threshold', int(threshold))
+    
+    def curve(self, lut):
+        """
+        自定义曲线
+        
+        参数:
+            lut: 256 个值（所有通道共用）或 768 个值（R, G, B 各 256 个）
+        """
+        lut = tuple(int(v) for v in lut)
+        if len(lut) not in (256, 768):
+            raise ValueError(f"曲线查找表长度必须是 256 或 768，当前为 {len(lut)}")
+        return PointPipeline(self.steps + (('curve', lut),))
+    
+    def grayscale(self):
+        """转换为灰度（之后的步骤作用在 L 图像上）"""
+        return PointPipeline(self.steps + (('grayscale', ()),))
+    
+    def black_and_white(self, threshold=128):
+        """转换为黑白二值图（与 convert_to_black_and_white 相同，输出 1 模式）"""
+        return self.grayscale().threshold(threshold)._add('bilevel')
+    
+    def compile(self):
+        """
+        返回各段合成后的查找表
+        
+        返回:
+            列表，每段为 (3, 256) 的数组；段之间隔着一次灰度转换
+        """
+        segments = [[]]
+        for step in self.steps:
+            if step[0] == 'grayscale':
+                segments.append([])
+            elif step[0] != 'bilevel':
+                segments[-1].append(step)
+        return [_compile_point_steps(tuple(segment)) for segment in segments]
+    
+    def apply(self, img):
+        """
+        应用流水线
+        
+        参数:
+            img: Image对象（L/RGB 直接处理，RGBA 的透明度保持不变，其他模式先转为 RGB）
+        
+        返回:
+            处理后的图像
+        """
+        print(f"逐点操作流水线: {len(self.steps)} 步")
+        if img.mode not in ('L', 'RGB', 'RGBA'):
+            img = img.convert('RGB')
+        luts = self.compile()
+        bilevel = bool(self.steps) and self.steps[-1][0] == 'bilevel'
+        for index, luts_segment in enumerate(luts):
+            if index > 0:
+                img = img.convert('L')
+            last = index == len(luts) - 1
+            if last and bilevel:
+                return img.point(luts_segment[0].tolist(), mode='1')
+            if np.array_equal(luts_segment, np.tile(np.arange(256), (3, 1))):
+                continue
+            bands = len(img.getbands())
+            table = luts_segment[:min(bands, 3)].ravel().tolist()
+            if bands == 4:
+                # 透明度通道保持不变
+                table += list(range(256))
+            img = img.point(table)
+        return img
+    
+    @staticmethod
+    def cache_info():
+        """合成查找表缓存的命中情况"""
+        return _compile_point_steps.cache_info()
 
 
 def replace_color(img, target_color, replacement_color, tolerance=0):
@@ -183,21 +476,30 @@ def replace_color(img, target_color, replacement_color, tolerance=0):
     """
     print(f"替换颜色: {target_color} -> {replacement_color}, 容差: {tolerance}")
     img_rgb = img.convert('RGB')
-    pixels = img_rgb.load()
-    
-    for y in range(img_rgb.height):
-        for x in range(img_rgb.width):
-            r, g, b = pixels[x, y]
-            
-            # 检查颜色是否在容差范围内
-            if (abs(r - target_color[0]) <= tolerance and
-                abs(g - target_color[1]) <= tolerance and
-                abs(b - target_color[2]) <= tolerance):
-                pixels[x, y] = replacement_color
-    
+    mask = _color_box_mask(img_rgb, target_color, tolerance)
+    # 只在命中像素的边界框内粘贴
+    box = mask.getbbox()
+    if box is not None:
+        img_rgb.paste(tuple(replacement_color), box, mask.crop(box))
     return img_rgb
 
 
+# 棕褐色转换系数（每行对应输出的 R, G, B）
+_SEPIA_COEFFS = (
+    (0.393, 0.769, 0.189),
+    (0.349, 0.686, 0.168),
+    (0.272, 0.534, 0.131),
+)
+
+
+# convert 矩阵的偏移量微调：远小于系数精确值的最小间隔 0.001，远大于 float32 误差
+_SEPIA_EPSILON = 0.0004
+
+
+def _sepia_matrix(offset):
+    return tuple(value for row in _SEPIA_COEFFS for value in row + (offset,))
+
+
 def apply_sepia(img):
     """
     应用复古棕褐色效果
@@ -209,23 +511,31 @@ def apply_sepia(img):
         棕褐色效果的图像
     """
     print("应用复古棕褐色效果")
-    img_rgb = img.convert('RGB')
-    width, height = img_rgb.size
-    pixels = img_rgb.load()
-    
-    for y in range(height):
-        for x in range(width):
-            r, g, b = pixels[x, y]
-            
-            # 棕褐色转换公式
-            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
-            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
-            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
-            
-            # 确保值在 0-255 范围内
-            pixels[x, y] = (min(255, tr), min(255, tg), min(255, tb))
+    img_rgb = img if img.mode == 'RGB' else img.convert('RGB')
     
-    return img_rgb
+    # 公式为 int(0.393*r + 0.769*g + 0.189*b)（截断，超过255取255）。
+    # convert 的矩阵变换用 float32 计算并四舍五入，偏移 -0.5 + ε 使其等于精确值向下取整；
+    # 精确值恰为整数时浮点计算可能略小于它而截断到下一级，这些像素在偏移 -0.5 - ε 时
+    # 结果不同，只对它们按原公式用 float64 重新计算
+    upper = img_rgb.convert('RGB', _sepia_matrix(-0.5 + _SEPIA_EPSILON))
+    lower = img_rgb.convert('RGB', _sepia_matrix(-0.5 - _SEPIA_EPSILON))
+    result = np.asarray(upper)
+    candidates = np.flatnonzero(result != np.asarray(lower))
+    if candidates.size == 0:
+        return upper
+    
+    ys, xs, channels = np.unravel_index(candidates, result.shape)
+    rgb = np.asarray(img_rgb)[ys, xs].astype(np.float64)
+    coeffs = np.array(_SEPIA_COEFFS)[channels]
+    exact = coeffs[:, 0] * rgb[:, 0] + coeffs[:, 1] * rgb[:, 1] + coeffs[:, 2] * rgb[:, 2]
+    exact = np.minimum(exact, 255).astype(np.uint8)
+    pixels = upper.load()
+    for i in np.flatnonzero(exact != result[ys, xs, channels]).tolist():
+        x, y = int(xs[i]), int(ys[i])
+        value = list(pixels[x, y])
+        value[channels[i]] = int(exact[i])
+        pixels[x, y] = tuple(value)
+    return upper
 
 
 def create_color_mask(img, color, tolerance=10):
@@ -241,21 +551,1176 @@ def create_color_mask(img, color, tolerance=10):
         遮罩图像（L模式）
     """
     print(f"创建颜色遮罩: 颜色 {color}, 容差 {tolerance}")
-    img_rgb = img.convert('RGB')
-    mask = Image.new('L', img_rgb.size, 0)
-    pixels = img_rgb.load()
-    mask_pixels = mask.load()
+    return _color_box_mask(img.convert('RGB'), color, tolerance)
+
+
+def _target_ranges(targets, tolerance):
+    """把目标颜色 (r, g, b) 或范围 ((r0, g0, b0), (r1, g1, b1)) 统一为 (n, 2, 3) 的闭区间数组"""
+    ranges = []
+    for target in targets:
+        if len(target) == 2 and all(isinstance(t, (tuple, list, np.ndarray)) for t in target):
+            low, high = target
+        else:
+            low = [c - tolerance for c in target[:3]]
+            high = [c + tolerance for c in target[:3]]
+        ranges.append((low[:3], high[:3]))
+    return np.array(ranges, dtype=np.int32).reshape(-1, 2, 3)
+
+
+def create_multi_color_mask(img, targets, tolerance=10):
+    """
+    一次遍历创建多目标颜色遮罩
+    
+    每个通道建一张 256 项的位掩码表（第 i 位表示该值落在第 i 个目标的范围内），
+    三个通道的位掩码按位与后非零即命中，代价与目标个数基本无关
+    
+    参数:
+        img: Image对象
+        targets: 目标列表，每项为颜色 (R, G, B)（按 tolerance 扩展为范围）
+            或闭区间 ((R0, G0, B0), (R1, G1, B1))
+        tolerance: 颜色目标的容差
+    
+    返回:
+        遮罩图像（L模式，命中任一目标为 255）
+    """
+    print(f"创建多目标颜色遮罩: {len(targets)} 个目标, 容差 {tolerance}")
+    ranges = _target_ranges(targets, tolerance)
+    rgb = np.asarray(img.convert('RGB'))
+    levels = np.arange(256)
+    hit = np.zeros(rgb.shape[:2], dtype=bool)
+    # 每组最多 64 个目标，正好放进一个 uint64
+    for start in range(0, len(ranges), 64):
+        group = ranges[start:start + 64]
+        dtype = next(t for t in (np.uint8, np.uint16, np.uint32, np.uint64)
+                     if np.dtype(t).itemsize * 8 >= len(group))
+        bits = (np.uint64(1) << np.arange(len(group), dtype=np.uint64)).astype(dtype)
+        bitmask = None
+        for channel in range(3):
+            inside = (levels[:, np.newaxis] >= group[:, 0, channel]) & \
+                (levels[:, np.newaxis] <= group[:, 1, channel])
+            table = np.bitwise_or.reduce(np.where(inside, bits, dtype(0)), axis=1).astype(dtype)
+            values = table.take(rgb[..., channel])
+            bitmask = values if bitmask is None else np.bitwise_and(bitmask, values, out=bitmask)
+        hit |= bitmask != 0
+    return Image.fromarray(hit.view(np.uint8) * np.uint8(255), 'L')
+
+
+def _mask_runs(mask):
+    """
+    提取每行中连续前景像素的游程
+    
+    返回:
+        (rows, starts, ends)，按行、列排序，ends 不含
+    """
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1]
+    return rows, starts, ends
+
+
+def _link_runs(rows, starts, ends, width, connectivity):
+    """
+    找出相邻两行中相互接触的游程对
+    
+    同一行的游程互不重叠且有序，上一行中与某游程接触的游程是一段连续区间，
+    用 searchsorted 一次求出所有区间的首尾
+    """
+    reach = 1 if connectivity == 8 else 0
+    stride = width + 2
+    key_starts = rows * stride + starts
+    key_ends = rows * stride + ends
+    base = (rows - 1) * stride
+    first = np.searchsorted(key_ends, base + starts - reach, side='right')
+    last = np.searchsorted(key_starts, base + ends + reach, side='left')
+    counts = np.maximum(last - first, 0)
+    if not counts.sum():
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    current = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return current, np.repeat(first, counts) + offsets
+
+
+def _union_runs(count, a, b):
+    """
+    并查集合并游程（向量化）：每轮把每条边两端的根中较大者挂到较小者下面，
+    再用指针跳跃压缩路径，直到所有边两端的根相同；每个连通域的根是其中最靠前的游程
+    """
+    parent = np.arange(count)
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        pending = root_a != root_b
+        if not pending.any():
+            return parent
+        a, b = a[pending], b[pending]
+        root_a, root_b = root_a[pending], root_b[pending]
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+
+
+def label_connected_components(mask, connectivity=8, min_area=1, return_labels=False):
+    """
+    连通域标记（基于游程的两遍并查集，向量化）
+    
+    第一遍把每行的前景像素压缩为游程，并合并上下相邻且接触的游程；
+    第二遍给每个连通域按光栅顺序编号，并按游程汇总面积、边界框和质心
+    
+    参数:
+        mask: 遮罩（Image 或二维数组，非零为前景）
+        connectivity: 4 或 8 连通
+        min_area: 面积小于该值的连通域被丢弃
+        return_labels: 是否同时返回标记图
+    
+    返回:
+        连通域列表，每项为字典 {'label', 'area', 'bbox': (left, top, right, bottom), 'centroid': (x, y)}，
+        bbox 的 right/bottom 不含；return_labels 为 True 时返回 (列表, int32 标记图)，背景为 0
+    """
+    if connectivity not in (4, 8):
+        raise ValueError(f"连通性必须是 4 或 8，当前为 {connectivity}")
+    mask = np.asarray(mask) != 0
+    height, width = mask.shape
+    rows, starts, ends = _mask_runs(mask)
+    current, previous = _link_runs(rows, starts, ends, width, connectivity)
+    parent = _union_runs(len(rows), current, previous)
+    
+    # 第二遍：根按出现顺序编号，再按编号汇总统计量
+    roots, run_labels = np.unique(parent, return_inverse=True)
+    lengths = ends - starts
+    area = np.bincount(run_labels, weights=lengths, minlength=len(roots))
+    sum_x = np.bincount(run_labels, weights=lengths * (starts + ends - 1) / 2, minlength=len(roots))
+    sum_y = np.bincount(run_labels, weights=lengths * rows, minlength=len(roots))
+    order = np.argsort(run_labels, kind='stable')
+    group_starts = np.searchsorted(run_labels[order], np.arange(len(roots)))
+    left = np.minimum.reduceat(starts[order], group_starts) if len(roots) else starts
+    right = np.maximum.reduceat(ends[order], group_starts) if len(roots) else ends
+    top = rows[order][group_starts] if len(roots) else rows
+    bottom = np.maximum.reduceat(rows[order], group_starts) + 1 if len(roots) else rows
+    
+    keep = area >= min_area
+    new_labels = np.zeros(len(roots) + 1, dtype=np.int32)
+    new_labels[1:][keep] = np.arange(1, keep.sum() + 1)
+    components = [
+        {'label': int(new_labels[i + 1]), 'area': int(area[i]),
+         'bbox': (int(left[i]), int(top[i]), int(right[i]), int(bottom[i])),
+         'centroid': (float(sum_x[i] / area[i]), float(sum_y[i] / area[i]))}
+        for i in np.flatnonzero(keep)
+    ]
+    print(f"连通域标记: {len(components)} 个连通域（{connectivity} 连通, 最小面积 {min_area}）")
+    if not return_labels:
+        return components
+    labels = np.zeros(height * width, dtype=np.int32)
+    total = int(lengths.sum())
+    pixel_offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    labels[np.repeat(rows * width + starts, lengths) + pixel_offsets] = \
+        np.repeat(new_labels[run_labels + 1], lengths)
+    return components, labels.reshape(height, width)
+
+
+def find_color_blobs(img, targets, tolerance=10, connectivity=8, min_area=1):
+    """
+    查找指定颜色的色块：多目标颜色遮罩 + 连通域统计
+    
+    参数:
+        img: Image对象
+        targets: 目标颜色或范围列表（同 create_multi_color_mask）
+        tolerance: 颜色目标的容差
+        connectivity: 4 或 8 连通
+        min_area: 最小面积
+    
+    返回:
+        连通域列表（同 label_connected_components）
+    """
+    mask = create_multi_color_mask(img, targets, tolerance)
+    return label_connected_components(mask, connectivity, min_area)
+
+
+# 调色板索引立方体：每个通道按高 5 位分成 32 格
+_CUBE_BITS = 5
+# 格子内任意一点到格子中心的最大距离（每格 8 级，中心在 3.5 处）
+_CUBE_HALF_DIAGONAL = 3.5 * math.sqrt(3) + 1e-6
+
+# 8x8 Bayer 有序抖动矩阵，归一化到 (-0.5, 0.5)
+_BAYER_8 = (np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+]) + 0.5) / 64 - 0.5
+
+
+class _PaletteIndex:
+    """
+    调色板的 32^3 最近颜色索引
+    
+    每个格子先记录离格子中心最近的颜色。格子内任意一点的最近颜色只可能是
+    到中心的距离不超过 最近距离 + 2 x 半对角线 的颜色，只有一个候选的格子直接查表；
+    其余格子保存候选列表，第一次有像素落入时才在候选中精确计算格内全部 8^3 个取值，
+    之后同样只需查表。结果与逐像素比较欧氏距离（相同时取下标最小者）完全一致
+    """
+    
+    def __init__(self, palette):
+        self.colors = np.array(palette, dtype=np.int32)
+        cells = 1 << _CUBE_BITS
+        step = 256 // cells
+        centers = np.arange(cells) * step + (step - 1) / 2
+        grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+        self.cube = np.empty(len(grid), dtype=np.intp)
+        rows = []
+        for start in range(0, len(grid), 4096):
+            diff = grid[start:start + 4096, np.newaxis, :] - self.colors[np.newaxis]
+            dist = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+            self.cube[start:start + 4096] = dist.argmin(axis=1)
+            rows.append(dist <= dist.min(axis=1, keepdims=True) + 2 * _CUBE_HALF_DIAGONAL)
+        candidate_mask = np.concatenate(rows)
+        self.ambiguous = np.flatnonzero(candidate_mask.sum(axis=1) > 1)
+        self.slots = np.full(len(grid), -1, dtype=np.intp)
+        self.slots[self.ambiguous] = np.arange(len(self.ambiguous))
+        # 候选按下标升序排列，不足的位置用该格的最近颜色补齐
+        mask = candidate_mask[self.ambiguous]
+        counts = mask.sum(axis=1, keepdims=True)
+        width = int(counts.max()) if len(self.ambiguous) else 1
+        candidates = np.argsort(~mask, axis=1, kind='stable')[:, :width]
+        self.candidates = np.where(np.arange(width) < counts, candidates,
+                                   self.cube[self.ambiguous, np.newaxis])
+        # 候选格的逐值查找表（格内偏移 r*64 + g*8 + b），按需填充
+        self.fine = np.zeros(len(self.ambiguous) * step ** 3,
+                             dtype=np.uint8 if len(palette) <= 256 else np.intp)
+        self.filled = np.zeros(len(self.ambiguous), dtype=bool)
+    
+    def _fill(self, slots):
+        """精确计算候选格内每个取值的最近颜色"""
+        step = 256 // (1 << _CUBE_BITS)
+        offsets = np.stack(np.meshgrid(*[np.arange(step)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+        cells = self.ambiguous[slots]
+        origins = np.stack([cells >> (2 * _CUBE_BITS), (cells >> _CUBE_BITS) & ((1 << _CUBE_BITS) - 1),
+                            cells & ((1 << _CUBE_BITS) - 1)], axis=1) * step
+        for start in range(0, len(slots), 64):
+            choices = self.candidates[slots[start:start + 64]]
+            points = origins[start:start + 64, np.newaxis, :] + offsets
+            diff = self.colors[choices][:, np.newaxis, :, :] - points[:, :, np.newaxis, :]
+            best = np.einsum('ijkl,ijkl->ijk', diff, diff).argmin(axis=2)
+            nearest = np.take_along_axis(choices, best, axis=1)
+            rows = slots[start:start + 64, np.newaxis] * len(offsets) + np.arange(len(offsets))
+            self.fine[rows] = nearest
+        self.filled[slots] = True
+    
+    def lookup(self, rgb):
+        """rgb 为 (M, 3) uint8 数组，返回每个像素最近的调色板颜色下标"""
+        shift = 8 - _CUBE_BITS
+        low = (1 << shift) - 1
+        cell = ((rgb[:, 0] >> shift).astype(np.intp) << (2 * _CUBE_BITS)) | \
+            ((rgb[:, 1] >> shift).astype(np.intp) << _CUBE_BITS) | (rgb[:, 2] >> shift)
+        nearest = self.cube.take(cell)
+        slot = self.slots.take(cell)
+        pending = np.flatnonzero(slot >= 0)
+        if len(pending):
+            slot = slot[pending]
+            hit = np.bincount(slot, minlength=len(self.filled)).astype(bool)
+            missing = np.flatnonzero(hit & ~self.filled)
+            if len(missing):
+                self._fill(missing)
+            pixels = rgb[pending]
+            inner = ((pixels[:, 0] & low).astype(np.intp) << (2 * shift)) | \
+                ((pixels[:, 1] & low).astype(np.intp) << shift) | (pixels[:, 2] & low)
+            nearest[pending] = self.fine.take(slot * (1 << 3 * shift) + inner)
+        return nearest
+
+
+@lru_cache(maxsize=32)
+def _palette_index(palette):
+    return _PaletteIndex(palette)
+
+
+def map_to_palette(img, palette, tolerance=None, dither=False, dither_spread=None,
+                   as_palette_image=False, chunk_pixels=1 << 20):
+    """
+    把图像映射到调色板（一次向量化遍历完成所有目标颜色的替换）
+    
+    调色板的最近颜色索引只构建一次并按调色板缓存，结果与逐像素计算欧氏距离取最近颜色相同
+    
+    参数:
+        img: Image对象（RGBA 的透明度保持不变，其他模式先转为 RGB）
+        palette: 颜色列表 [(r, g, b), ...]
+        tolerance: 最大替换距离，离最近颜色超过该距离的像素保持原色；None 表示全部替换
+        dither: 是否使用 8x8 有序抖动
+        dither_spread: 抖动幅度，默认为调色板颜色的平均间距 256 / n^(1/3)
+        as_palette_image: 是否返回 P 模式图像（不能与 tolerance 同时使用，最多 256 色）
+        chunk_pixels: 分块处理的像素数，限制临时内存
     
-    for y in range(img_rgb.height):
-        for x in range(img_rgb.width):
-            r, g, b = pixels[x, y]
-            
-            if (abs(r - color[0]) <= tolerance and
-                abs(g - color[1]) <= tolerance and
-                abs(b - color[2]) <= tolerance):
-                mask_pixels[x, y] = 255
+    返回:
+        映射后的图像
+    """
+    palette = tuple(tuple(int(c) for c in color[:3]) for color in palette)
+    print(f"映射到调色板: {len(palette)} 色, 容差 {tolerance}, {'有序抖动' if dither else '无抖动'}")
+    if as_palette_image and (tolerance is not None or len(palette) > 256):
+        raise ValueError("P 模式输出要求不设置容差且调色板不超过 256 色")
+    index = _palette_index(palette)
+    colors = index.colors
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    array = np.asarray(img)
+    height, width = array.shape[:2]
+    src = array[..., :3].reshape(-1, 3)
+    nearest = np.empty(len(src), dtype=np.intp)
+    if dither:
+        spread = dither_spread if dither_spread is not None else 256 / len(palette) ** (1 / 3)
+        # 每行的抖动偏移只与 行号 % 8 有关，预先按图像宽度展开 8 行
+        bayer_rows = (_BAYER_8[:, np.arange(width) % 8] * spread).astype(np.float32)
+    rows_per_chunk = max(1, chunk_pixels // width)
+    for top in range(0, height, rows_per_chunk):
+        bottom = min(top + rows_per_chunk, height)
+        chunk = slice(top * width, bottom * width)
+        pixels = src[chunk]
+        if dither:
+            offsets = bayer_rows[np.arange(top, bottom) % 8].reshape(-1, 1)
+            pixels = np.clip(pixels + offsets + 0.5, 0, 255).astype(np.uint8)
+        nearest[chunk] = index.lookup(pixels)
     
-    return mask
+    if as_palette_image:
+        result = Image.fromarray(nearest.astype(np.uint8).reshape(height, width), 'P')
+        result.putpalette([c for color in palette for c in color])
+        return result
+    mapped = colors.astype(np.uint8)[nearest]
+    if tolerance is not None:
+        diff = mapped.astype(np.int32) - src
+        far = np.einsum('ij,ij->i', diff, diff) > tolerance * tolerance
+        mapped[far] = src[far]
+    result = array.copy()
+    result[..., :3] = mapped.reshape(height, width, 3)
+    return Image.fromarray(result, img.mode)
+
+
+class ColorMatrix:
+    """
+    RGB 仿射颜色矩阵（3x4）
+    
+    每个输出通道 = 输入 R, G, B 的线性组合 + 偏移量。多个矩阵先在符号上合成为一个，
+    再用一次 Image.convert('RGB', matrix) 作用到整幅图像上，不必逐个效果全图处理；
+    合成后没有中间结果的截断和取整，精度不低于逐次应用。
+    
+    用法:
+        grade = ColorMatrix.sepia().then(ColorMatrix.saturation(0.6)).then(ColorMatrix.hue_rotation(15))
+        result = grade.apply(img)
+    """
+    
+    def __init__(self, matrix):
+        """
+        参数:
+            matrix: 3x4 数组（每行为 [r系数, g系数, b系数, 偏移]），
+                或 3x3 数组（无偏移），或 Pillow 的 12 元组
+        """
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.size == 12:
+            matrix = matrix.reshape(3, 4)
+        elif matrix.shape == (3, 3):
+            matrix = np.hstack([matrix, np.zeros((3, 1))])
+        else:
+            raise ValueError(f"颜色矩阵必须是 3x4 或 3x3，当前形状为 {matrix.shape}")
+        self.matrix = matrix
+    
+    def __repr__(self):
+        return f"ColorMatrix({(self.matrix.round(4) + 0.0).tolist()})"
+    
+    def __eq__(self, other):
+        return isinstance(other, ColorMatrix) and np.allclose(self.matrix, other.matrix)
+    
+    def __matmul__(self, other):
+        """self @ other 表示先应用 other，再应用 self（与矩阵乘法顺序一致）"""
+        linear = self.matrix[:, :3] @ other.matrix[:, :3]
+        offset = self.matrix[:, :3] @ other.matrix[:, 3] + self.matrix[:, 3]
+        return ColorMatrix(np.hstack([linear, offset[:, np.newaxis]]))
+    
+    def then(self, other):
+        """返回先应用自身、再应用 other 的合成矩阵"""
+        return other @ self
+    
+    def to_pillow(self):
+        """转换为 Image.convert 使用的 12 元组"""
+        return tuple(float(v) for v in self.matrix.ravel())
+    
+    def apply(self, img):
+        """
+        一次性把矩阵作用到图像上（Pillow 单次转换，结果四舍五入并截断到 0-255）
+        
+        参数:
+            img: Image对象，RGBA 的透明度保持不变，其他模式先转换为 RGB
+        
+        返回:
+            RGB 或 RGBA 图像
+        """
+        if img.mode == 'RGBA':
+            result = img.convert('RGB').convert('RGB', self.to_pillow())
+            result.putalpha(img.getchannel('A'))
+            return result
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return img.convert('RGB', self.to_pillow())
+    
+    def apply_array(self, array, clip=None, chunk_pixels=1 << 20):
+        """
+        用 NumPy 把矩阵作用到 HxWx3（或 Nx3）数组上，适合浮点数据（如线性光、HDR）
+        
+        参数:
+            array: 颜色数组，任意数值类型
+            clip: (最小值, 最大值)，None 表示不截断
+            chunk_pixels: 分块处理的像素数，限制临时内存
+        
+        返回:
+            float32 数组，形状与输入相同
+        """
+        array = np.asarray(array)
+        flat = array.reshape(-1, 3)
+        out = np.empty(flat.shape, dtype=np.float32)
+        linear = self.matrix[:, :3].T.astype(np.float32)
+        offset = self.matrix[:, 3].astype(np.float32)
+        for start in range(0, flat.shape[0], chunk_pixels):
+            chunk = out[start:start + chunk_pixels]
+            np.matmul(flat[start:start + chunk_pixels].astype(np.float32), linear, out=chunk)
+            chunk += offset
+            if clip is not None:
+                np.clip(chunk, clip[0], clip[1], out=chunk)
+        return out.reshape(array.shape)
+    
+    @classmethod
+    def identity(cls):
+        """单位矩阵"""
+        return cls(np.eye(3))
+    
+    @classmethod
+    def sepia(cls):
+        """
+        棕褐色预设（与 apply_sepia 相同的系数）
+        
+        与其他矩阵一样四舍五入；apply_sepia 保持原公式 int(...) 的截断结果，两者可能相差 1 级
+        """
+        return cls(_SEPIA_COEFFS)
+    
+    @classmethod
+    def grayscale(cls, weights=(0.299, 0.587, 0.114)):
+        """
+        灰度（三个输出通道都等于加权亮度）
+        
+        参数:
+            weights: R, G, B 权重，默认与 convert('L') 相同（ITU-R 601-2）
+        """
+        return cls([list(weights)] * 3)
+    
+    @classmethod
+    def channel_mixer(cls, red=(1, 0, 0), green=(0, 1, 0), blue=(0, 0, 1), offset=(0, 0, 0)):
+        """
+        通道混合器
+        
+        参数:
+            red, green, blue: 每个输出通道取输入 R, G, B 的比例
+            offset: 每个输出通道的偏移量
+        """
+        return cls([list(red) + [offset[0]], list(green) + [offset[1]], list(blue) + [offset[2]]])
+    
+    @classmethod
+    def channel_swap(cls, order='BGR'):
+        """
+        交换通道
+        
+        参数:
+            order: 输出的 R, G, B 依次取自哪个输入通道，如 'BGR'、'BRG'
+                （'BRG' 与 merge_channels('RGB', (b, r, g)) 相同）
+        """
+        rows = np.zeros((3, 3))
+        for out_channel, name in enumerate(order.upper()):
+            rows[out_channel, 'RGB'.index(name)] = 1
+        return cls(rows)
+    
+    @classmethod
+    def saturation(cls, factor):
+        """
+        饱和度（0 为去色，1 不变，大于 1 增强），亮度权重与 SVG feColorMatrix 相同
+        """
+        s = factor
+        return cls([
+            [0.213 + 0.787 * s, 0.715 - 0.715 * s, 0.072 - 0.072 * s],
+            [0.213 - 0.213 * s, 0.715 + 0.285 * s, 0.072 - 0.072 * s],
+            [0.213 - 0.213 * s, 0.715 - 0.715 * s, 0.072 + 0.928 * s],
+        ])
+    
+    @classmethod
+    def hue_rotation(cls, degrees):
+        """色相旋转（近似保持亮度，与 SVG feColorMatrix hueRotate 相同）"""
+        c = math.cos(math.radians(degrees))
+        s = math.sin(math.radians(degrees))
+        return cls([
+            [0.213 + c * 0.787 - s * 0.213, 0.715 - c * 0.715 - s * 0.715, 0.072 - c * 0.072 + s * 0.928],
+            [0.213 - c * 0.213 + s * 0.143, 0.715 + c * 0.285 + s * 0.140, 0.072 - c * 0.072 - s * 0.283],
+            [0.213 - c * 0.213 - s * 0.787, 0.715 - c * 0.715 + s * 0.715, 0.072 + c * 0.928 + s * 0.072],
+        ])
+    
+    @classmethod
+    def brightness(cls, factor):
+        """亮度缩放"""
+        return cls(np.eye(3) * factor)
+    
+    @classmethod
+    def contrast(cls, factor, pivot=128):
+        """以 pivot 为中心的对比度缩放"""
+        return cls(np.hstack([np.eye(3) * factor, np.full((3, 1), pivot * (1 - factor))]))
+    
+    @classmethod
+    def invert(cls):
+        """反色"""
+        return cls(np.hstack([-np.eye(3), np.full((3, 1), 255.0)]))
+
+
+def apply_color_matrix(img, *matrices):
+    """
+    把一个或多个颜色矩阵合成后一次性应用到图像上
+    
+    参数:
+        img: Image对象
+        *matrices: ColorMatrix 对象，按应用顺序排列
+    
+    返回:
+        处理后的图像
+    """
+    print(f"应用颜色矩阵: {len(matrices)} 个合成为 1 次转换")
+    combined = ColorMatrix.identity()
+    for matrix in matrices:
+        combined = combined.then(matrix)
+    return combined.apply(img)
+
+
+def convert_to_hsv(img):
+    """
+    转换到 HSV（Pillow 的 HSV 模式，三个通道都是 0-255，H 的 256 级对应 360 度）
+    
+    参数:
+        img: Image对象
+    
+    返回:
+        HSV 模式图像
+    """
+    print("转换颜色空间: RGB -> HSV")
+    return img.convert('RGB').convert('HSV')
+
+
+def convert_from_hsv(img):
+    """HSV 模式图像转换回 RGB"""
+    print("转换颜色空间: HSV -> RGB")
+    return img.convert('RGB')
+
+
+def rgb_to_hsl(array):
+    """
+    RGB -> HSL（NumPy 向量化）
+    
+    参数:
+        array: ...x3 的 RGB 数组，uint8（0-255）或浮点（0-1）
+    
+    返回:
+        float32 数组，H 为 0-360 度，S、L 为 0-1
+    """
+    rgb = np.asarray(array)
+    rgb = rgb / np.float32(255) if rgb.dtype == np.uint8 else rgb.astype(np.float32, copy=False)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    high = np.maximum(np.maximum(r, g), b)
+    low = np.minimum(np.minimum(r, g), b)
+    delta = high - low
+    out = np.zeros(rgb.shape, dtype=np.float32)
+    hue, saturation, lightness = out[..., 0], out[..., 1], out[..., 2]
+    np.add(high, low, out=lightness)
+    lightness *= 0.5
+    chroma = delta > 0
+    # 有彩度时 0 < L < 1，分母 1 - |2L - 1| 必然大于 0
+    np.divide(delta, 1 - np.abs(2 * lightness - 1), out=saturation, where=chroma)
+    safe = np.where(chroma, delta, 1)
+    # 最大分量为 R/G/B 时色相分别落在 [-1, 1)、[1, 3)、[3, 5) 段，只有第一段需要加 6
+    np.copyto(hue, np.where(high == r, (g - b) / safe,
+                            np.where(high == g, (b - r) / safe + 2, (r - g) / safe + 4)))
+    hue[hue < 0] += 6
+    hue *= 60
+    hue[~chroma] = 0
+    return out
+
+
+def hsl_to_rgb(array):
+    """
+    HSL -> RGB（NumPy 向量化）
+    
+    参数:
+        array: ...x3 的 HSL 数组（H 为度，S、L 为 0-1）
+    
+    返回:
+        float32 RGB 数组（0-1）
+    """
+    hsl = np.asarray(array, dtype=np.float32)
+    hue, saturation, lightness = hsl[..., 0], hsl[..., 1], hsl[..., 2]
+    amount = saturation * np.minimum(lightness, 1 - lightness)
+    sector = np.mod(hue / 30, 12)
+    out = np.empty(hsl.shape, dtype=np.float32)
+    # f(n) = L - a * max(-1, min(k - 3, 9 - k, 1))，k = (n + H / 30) mod 12，n 为 0/8/4
+    for channel, n in enumerate((0, 8, 4)):
+        k = sector + n
+        k[k >= 12] -= 12
+        step = np.minimum(np.minimum(k - 3, 9 - k), 1)
+        np.maximum(step, -1, out=step)
+        step *= amount
+        np.subtract(lightness, step, out=out[..., channel])
+    return out
+
+
+# sRGB (D65) -> XYZ 矩阵和参考白
+_SRGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                         [0.2126729, 0.7151522, 0.0721750],
+                         [0.0193339, 0.1191920, 0.9503041]], dtype=np.float32)
+_XYZ_TO_SRGB = np.linalg.inv(_SRGB_TO_XYZ).astype(np.float32)
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_LAB_EPSILON = (6 / 29) ** 3
+
+
+@lru_cache(maxsize=1)
+def _srgb_linear_table():
+    """uint8 sRGB -> 线性光的 256 项查找表（避免逐像素求幂）"""
+    c = np.arange(256) / 255.0
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+
+def rgb_to_lab(array):
+    """
+    sRGB -> CIE Lab（D65，NumPy 向量化）
+    
+    参数:
+        array: ...x3 的 RGB 数组，uint8（0-255）或浮点（0-1）
+    
+    返回:
+        float32 数组，L 为 0-100，a/b 约为 -128 到 127
+    """
+    rgb = np.asarray(array)
+    if rgb.dtype == np.uint8:
+        linear = _srgb_linear_table()[rgb]
+    else:
+        c = rgb.astype(np.float32)
+        linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ (_SRGB_TO_XYZ.T / _D65_WHITE)
+    small = xyz <= _LAB_EPSILON
+    f = np.cbrt(xyz)
+    f[small] = xyz[small] / (3 * (6 / 29) ** 2) + 4 / 29
+    out = np.empty(f.shape, dtype=np.float32)
+    np.multiply(f[..., 1], 116, out=out[..., 0])
+    out[..., 0] -= 16
+    np.subtract(f[..., 0], f[..., 1], out=out[..., 1])
+    out[..., 1] *= 500
+    np.subtract(f[..., 1], f[..., 2], out=out[..., 2])
+    out[..., 2] *= 200
+    return out
+
+
+def lab_to_rgb(array):
+    """
+    CIE Lab（D65）-> sRGB（NumPy 向量化）
+    
+    参数:
+        array: ...x3 的 Lab 数组
+    
+    返回:
+        float32 RGB 数组（0-1，超出 sRGB 色域的颜色已截断）
+    """
+    lab = np.asarray(array, dtype=np.float32)
+    f = np.empty(lab.shape, dtype=np.float32)
+    np.add(lab[..., 0], 16, out=f[..., 1])
+    f[..., 1] /= 116
+    np.add(f[..., 1], lab[..., 1] / 500, out=f[..., 0])
+    np.subtract(f[..., 1], lab[..., 2] / 200, out=f[..., 2])
+    small = f <= 6 / 29
+    xyz = f ** 3
+    xyz[small] = 3 * (6 / 29) ** 2 * (f[small] - 4 / 29)
+    linear = xyz @ (_XYZ_TO_SRGB * _D65_WHITE).T
+    np.clip(linear, 0, 1, out=linear)
+    small = linear <= 0.0031308
+    rgb = np.power(linear, 1 / 2.4)
+    rgb *= 1.055
+    rgb -= 0.055
+    rgb[small] = linear[small] * 12.92
+    return rgb
+
+
+def _map_rgb_pixels(img, func, chunk_pixels):
+    """
+    按块把 (M, 3) uint8 像素交给 func，func 返回 0-1 的 float32 RGB，
+    四舍五入后原地写回图像副本；RGBA 的透明度保持不变
+    """
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    array = np.array(img)
+    flat = array.reshape(-1, array.shape[-1])
+    for start in range(0, len(flat), chunk_pixels):
+        chunk = flat[start:start + chunk_pixels, :3]
+        rgb = func(chunk)
+        rgb *= 255
+        rgb += 0.5
+        np.clip(rgb, 0, 255, out=rgb)
+        chunk[...] = rgb
+    return Image.fromarray(array, img.mode)
+
+
+def adjust_hsv(img, hue_shift=0, saturation=1.0, value=1.0):
+    """
+    在 HSV 空间中调整色相、饱和度和明度
+    
+    三个通道的调整合成为一张 768 项查找表，在 Pillow 的 HSV 图像上用一次 point() 完成，
+    不产生任何浮点中间图像
+    
+    参数:
+        img: Image对象（RGBA 的透明度保持不变）
+        hue_shift: 色相旋转角度（度）
+        saturation: 饱和度倍数
+        value: 明度倍数
+    
+    返回:
+        调整后的 RGB/RGBA 图像
+    """
+    print(f"HSV 调整: 色相 {hue_shift:+}°, 饱和度 x{saturation}, 明度 x{value}")
+    shift = int(round(hue_shift * 256 / 360))
+    if shift % 256 == 0 and saturation == 1 and value == 1:
+        # 不做任何调整时跳过 RGB -> HSV -> RGB 往返（往返会让部分像素偏差 1-2 级）
+        return img.copy() if img.mode in ('RGB', 'RGBA') else img.convert('RGB')
+    levels = np.arange(256)
+    table = np.concatenate([(levels + shift) % 256,
+                            np.clip(np.rint(levels * saturation), 0, 255),
+                            np.clip(np.rint(levels * value), 0, 255)]).astype(int).tolist()
+    result = img.convert('RGB').convert('HSV').point(table).convert('RGB')
+    if img.mode == 'RGBA':
+        result.putalpha(img.getchannel('A'))
+    return result
+
+
+def rotate_hue(img, degrees):
+    """
+    色相旋转（HSV 空间，只改变 H 通道）
+    
+    参数:
+        img: Image对象
+        degrees: 旋转角度
+    
+    返回:
+        调整后的图像
+    """
+    return adjust_hsv(img, hue_shift=degrees)
+
+
+def adjust_hsl(img, hue_shift=0, saturation=1.0, lightness=1.0, chunk_pixels=1 << 20):
+    """
+    在 HSL 空间中调整色相、饱和度和亮度（NumPy 向量化，分块处理限制临时内存）
+    
+    参数:
+        img: Image对象（RGBA 的透明度保持不变）
+        hue_shift: 色相旋转角度（度）
+        saturation: 饱和度倍数
+        lightness: 亮度倍数
+        chunk_pixels: 每块的像素数
+    
+    返回:
+        调整后的 RGB/RGBA 图像
+    """
+    print(f"HSL 调整: 色相 {hue_shift:+}°, 饱和度 x{saturation}, 亮度 x{lightness}")
+    
+    def adjust(pixels):
+        hsl = rgb_to_hsl(pixels)
+        hsl[:, 0] += hue_shift
+        hsl[:, 1:] *= (saturation, lightness)
+        np.clip(hsl[:, 1:], 0, 1, out=hsl[:, 1:])
+        return hsl_to_rgb(hsl)
+    
+    return _map_rgb_pixels(img, adjust, chunk_pixels)
+
+
+def adjust_lightness(img, factor=1.0, space='lab', chunk_pixels=1 << 20):
+    """
+    调整亮度而不改变色相
+    
+    参数:
+        img: Image对象（RGBA 的透明度保持不变）
+        factor: 亮度倍数
+        space: 'lab'（缩放 CIE L*，a*/b* 不变，感知上更均匀）或 'hsl'
+        chunk_pixels: 每块的像素数
+    
+    返回:
+        调整后的图像
+    """
+    if space == 'hsl':
+        return adjust_hsl(img, lightness=factor, chunk_pixels=chunk_pixels)
+    if space != 'lab':
+        raise ValueError(f"未知的颜色空间: {space}")
+    print(f"Lab 亮度调整: x{factor}")
+    
+    def adjust(pixels):
+        lab = rgb_to_lab(pixels)
+        lab[:, 0] *= factor
+        np.clip(lab[:, 0], 0, 100, out=lab[:, 0])
+        return lab_to_rgb(lab)
+    
+    return _map_rgb_pixels(img, adjust, chunk_pixels)
+
+
+class CubeLUT:
+    """
+    3D 颜色查找表（.cube 格式）
+    
+    属性:
+        title: 标题
+        size: 每个维度的格点数 N
+        table: float32 只读数组，形状 (N, N, N, 3)，按 [b, g, r] 索引（文件中 R 变化最快）
+        domain_min, domain_max: 输入值域，默认 (0, 0, 0) - (1, 1, 1)
+    """
+    
+    def __init__(self, table, title='', domain_min=(0.0, 0.0, 0.0), domain_max=(1.0, 1.0, 1.0)):
+        table = np.array(table, dtype=np.float32)
+        size = table.shape[0]
+        if size < 2 or table.shape != (size, size, size, 3):
+            raise ValueError(f"3D LUT 的形状必须是 (N, N, N, 3)，当前为 {table.shape}")
+        table.flags.writeable = False
+        self.table = table
+        self.size = size
+        self.title = title
+        self.domain_min = tuple(float(v) for v in domain_min)
+        self.domain_max = tuple(float(v) for v in domain_max)
+        self._filter = None
+    
+    def __repr__(self):
+        return f"CubeLUT(title={self.title!r}, size={self.size})"
+    
+    @classmethod
+    def from_function(cls, func, size=33, title=''):
+        """
+        按函数采样生成查找表
+        
+        参数:
+            func: func(r, g, b) -> (r, g, b)，输入输出都是 0-1 的 NumPy 数组
+            size: 每个维度的格点数
+            title: 标题
+        """
+        grid = np.linspace(0.0, 1.0, size, dtype=np.float32)
+        b, g, r = np.meshgrid(grid, grid, grid, indexing='ij')
+        channels = [np.broadcast_to(c, r.shape) for c in func(r, g, b)]
+        return cls(np.stack(channels, axis=-1), title)
+    
+    @property
+    def has_default_domain(self):
+        return self.domain_min == (0.0, 0.0, 0.0) and self.domain_max == (1.0, 1.0, 1.0)
+    
+    def to_filter(self):
+        """转换为 ImageFilter.Color3DLUT（首次调用时创建并保存；Pillow 只支持 2-65 个格点）"""
+        if self._filter is None:
+            self._filter = ImageFilter.Color3DLUT(self.size, self.table.ravel(), channels=3)
+        return self._filter
+    
+    def save(self, path):
+        """保存为 .cube 文件"""
+        lines = [f'TITLE "{self.title}"'] if self.title else []
+        lines.append(f"LUT_3D_SIZE {self.size}")
+        if not self.has_default_domain:
+            lines.append("DOMAIN_MIN " + " ".join(f"{v:g}" for v in self.domain_min))
+            lines.append("DOMAIN_MAX " + " ".join(f"{v:g}" for v in self.domain_max))
+        lines.extend(f"{r:.6f} {g:.6f} {b:.6f}" for r, g, b in self.table.reshape(-1, 3).tolist())
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def _parse_cube(text):
+    """解析 .cube 文本"""
+    title, size = '', None
+    domain_min, domain_max = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+    rows = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if line[0].isdigit() or line[0] in '+-.':
+            rows.append(line)
+            continue
+        key, _, rest = line.partition(' ')
+        rest = rest.strip()
+        if key == 'TITLE':
+            title = rest.strip('"')
+        elif key == 'LUT_3D_SIZE':
+            size = int(rest)
+        elif key == 'DOMAIN_MIN':
+            domain_min = tuple(float(v) for v in rest.split())
+        elif key == 'DOMAIN_MAX':
+            domain_max = tuple(float(v) for v in rest.split())
+        elif key == 'LUT_3D_INPUT_RANGE':
+            low, high = (float(v) for v in rest.split())
+            domain_min, domain_max = (low,) * 3, (high,) * 3
+        elif key == 'LUT_1D_SIZE':
+            raise ValueError("不支持 1D LUT，只能加载 3D LUT")
+    if size is None:
+        raise ValueError("缺少 LUT_3D_SIZE")
+    data = np.array(" ".join(rows).split(), dtype=np.float32)
+    if data.size != size ** 3 * 3:
+        raise ValueError(f"数据行数应为 {size ** 3}，实际为 {data.size // 3}")
+    return CubeLUT(data.reshape(size, size, size, 3), title, domain_min, domain_max)
+
+
+# 已解析的 .cube 文件，按文件内容的 SHA-256 缓存（同一内容不同路径也只解析一次）
+_CUBE_CACHE = OrderedDict()
+_CUBE_CACHE_SIZE = 16
+
+
+def load_cube_lut(path):
+    """
+    加载 .cube 3D LUT 文件，按文件内容哈希缓存解析结果
+    
+    参数:
+        path: .cube 文件路径
+    
+    返回:
+        CubeLUT 对象
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    lut = _CUBE_CACHE.get(digest)
+    if lut is not None:
+        _CUBE_CACHE.move_to_end(digest)
+        print(f"加载 3D LUT: {path}（缓存命中）")
+        return lut
+    lut = _parse_cube(data.decode('utf-8', errors='replace'))
+    print(f"加载 3D LUT: {path}, {lut.size}^3 格点")
+    _CUBE_CACHE[digest] = lut
+    while len(_CUBE_CACHE) > _CUBE_CACHE_SIZE:
+        _CUBE_CACHE.popitem(last=False)
+    return lut
+
+
+def _tetrahedral_lookup(rgb, lut, chunk_pixels=1 << 18):
+    """
+    四面体插值查表（NumPy 向量化）
+    
+    每个像素所在格子按三个小数部分的大小顺序切成 6 个四面体之一，
+    只用 4 个顶点加权，比三线性插值少一半取数，且灰轴上的颜色保持在灰轴上。
+    位于四面体公共面上的像素（小数部分相等）在相邻四面体中的结果相同
+    """
+    n = lut.size
+    values = lut.table.reshape(-1, 3)
+    strides = np.array([1, n, n * n])
+    # uint8 输入只有 256 级：预先算出每个通道每一级的格子下标和小数部分
+    low = np.array(lut.domain_min, dtype=np.float64)[:, np.newaxis]
+    high = np.array(lut.domain_max, dtype=np.float64)[:, np.newaxis]
+    position = np.clip((np.arange(256) / 255.0 - low) / (high - low), 0.0, 1.0) * (n - 1)
+    cell = np.minimum(position.astype(np.intp), n - 2)
+    level_base = cell * strides[:, np.newaxis]
+    level_frac = (position - cell).astype(np.float32)
+    
+    corner = 1 + n + n * n
+    src = rgb.reshape(-1, 3)
+    out = np.empty(src.shape, dtype=np.uint8)
+    for start in range(0, src.shape[0], chunk_pixels):
+        pixels = src[start:start + chunk_pixels]
+        r, g, b = pixels[:, 0], pixels[:, 1], pixels[:, 2]
+        base = level_base[0].take(r) + level_base[1].take(g) + level_base[2].take(b)
+        fr, fg, fb = level_frac[0].take(r), level_frac[1].take(g), level_frac[2].take(b)
+        # 四面体的顶点：从格子原点出发，先沿小数最大的轴走一步，最后一步沿小数最小的轴
+        high = np.maximum(np.maximum(fr, fg), fb)
+        low = np.minimum(np.minimum(fr, fg), fb)
+        mid = fr + fg + fb - high - low
+        step_high = np.where(fr >= fg, np.where(fr >= fb, 1, n * n), np.where(fg >= fb, n, n * n))
+        step_low = np.where(fr < fg, np.where(fr < fb, 1, n * n), np.where(fg < fb, n, n * n))
+        result = values.take(base, axis=0)
+        result *= (1.0 - high)[:, np.newaxis]
+        result += values.take(base + step_high, axis=0) * (high - mid)[:, np.newaxis]
+        result += values.take(base + corner - step_low, axis=0) * (mid - low)[:, np.newaxis]
+        result += values.take(base + corner, axis=0) * low[:, np.newaxis]
+        result *= 255.0
+        result += 0.5
+        np.clip(result, 0, 255, out=result)
+        out[start:start + chunk_pixels] = result
+    return out.reshape(rgb.shape)
+
+
+def _apply_3d_lut(img, lut, method):
+    if method == 'auto':
+        method = 'pillow' if lut.size <= 65 and lut.has_default_domain else 'tetrahedral'
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if method == 'pillow':
+        # Pillow 内置三线性插值，RGBA 的透明度保持不变
+        return img.filter(lut.to_filter())
+    if method != 'tetrahedral':
+        raise ValueError(f"未知的插值方法: {method}")
+    array = np.asarray(img)
+    result = array.copy()
+    result[..., :3] = _tetrahedral_lookup(np.ascontiguousarray(array[..., :3]), lut)
+    return Image.fromarray(result, img.mode)
+
+
+def apply_3d_lut(img, lut, method='auto'):
+    """
+    应用 3D LUT 调色
+    
+    参数:
+        img: Image对象（RGBA 的透明度保持不变，其他模式先转为 RGB）
+        lut: CubeLUT 对象或 .cube 文件路径
+        method: 'pillow'（ImageFilter.Color3DLUT 三线性插值）、
+            'tetrahedral'（NumPy 四面体插值，支持任意格点数和值域）、
+            'auto'（格点数不超过 65 且值域为 0-1 时用 pillow，否则用 tetrahedral）
+    
+    返回:
+        调色后的图像
+    """
+    if not isinstance(lut, CubeLUT):
+        lut = load_cube_lut(lut)
+    print(f"应用 3D LUT: {lut.size}^3 格点, 方法 {method}")
+    return _apply_3d_lut(img, lut, method)
+
+
+def apply_3d_lut_batch(images, lut, method='auto', workers=None):
+    """
+    在线程池中把同一个 3D LUT 应用到多幅图像
+    
+    查找表只加载和转换一次；Pillow 滤镜和 NumPy 运算都会释放 GIL，多线程可以并行
+    
+    参数:
+        images: Image对象或图像路径的列表
+        lut: CubeLUT 对象或 .cube 文件路径
+        method: 插值方法（同 apply_3d_lut）
+        workers: 线程数，默认由 ThreadPoolExecutor 决定
+    
+    返回:
+        调色后的图像列表，顺序与输入相同
+    """
+    if not isinstance(lut, CubeLUT):
+        lut = load_cube_lut(lut)
+    print(f"批量应用 3D LUT: {len(images)} 幅图像, {lut.size}^3 格点")
+    
+    def process(image):
+        if not isinstance(image, Image.Image):
+            with Image.open(image) as opened:
+                image = opened.convert('RGBA' if 'A' in opened.getbands() else 'RGB')
+        return _apply_3d_lut(image, lut, method)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(process, images))
+
+
+# ICC 色彩空间 -> Pillow 图像模式
+_ICC_COLOR_SPACE_MODES = {'RGB': 'RGB', 'CMYK': 'CMYK', 'GRAY': 'L', 'LAB': 'LAB'}
+
+# 已构建的 ICC 转换，按 (源配置键, 目标配置键, 渲染意图, 输入模式, 输出模式) 缓存
+_ICC_TRANSFORMS = OrderedDict()
+_ICC_TRANSFORM_CACHE_SIZE = 32
+_icc_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def _icc_profile_key(profile):
+    """
+    返回配置文件的缓存键和来源
+    
+    内置名称（'sRGB'、'LAB'、'XYZ'）以名称为键，其余以配置文件内容的 SHA-256 为键，
+    缓存命中时无需解析配置文件
+    """
+    if isinstance(profile, ImageCms.ImageCmsProfile):
+        profile = profile.tobytes()
+    elif isinstance(profile, str) and profile not in ('sRGB', 'LAB', 'XYZ'):
+        with open(profile, 'rb') as f:
+            profile = f.read()
+    if isinstance(profile, bytes):
+        return hashlib.sha256(profile).hexdigest(), profile
+    return profile, profile
+
+
+def _open_icc_profile(source):
+    if isinstance(source, bytes):
+        return ImageCms.ImageCmsProfile(io.BytesIO(source))
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile(source))
+
+
+def _profile_mode(profile):
+    return _ICC_COLOR_SPACE_MODES.get(profile.profile.xcolor_space.strip().upper())
+
+
+def get_icc_transform(src_profile, dst_profile='sRGB', in_mode='RGB', out_mode=None,
+                      intent=ImageCms.Intent.PERCEPTUAL):
+    """
+    获取（必要时构建）ICC 颜色转换，结果按配置文件内容、渲染意图和模式 LRU 缓存
+    
+    参数:
+        src_profile, dst_profile: 'sRGB'/'LAB'/'XYZ'、配置文件路径、ICC 字节串或 ImageCmsProfile
+        in_mode: 输入图像模式
+        out_mode: 输出图像模式，None 表示按目标配置的色彩空间决定（RGBA 输入保持 RGBA）
+        intent: 渲染意图（ImageCms.Intent）
+    
+    返回:
+        ImageCms.ImageCmsTransform 对象
+    """
+    src_key, src_source = _icc_profile_key(src_profile)
+    dst_key, dst_source = _icc_profile_key(dst_profile)
+    key = (src_key, dst_key, int(intent), in_mode, out_mode)
+    transform = _ICC_TRANSFORMS.get(key)
+    if transform is not None:
+        _ICC_TRANSFORMS.move_to_end(key)
+        _icc_cache_stats['hits'] += 1
+        return transform
+    _icc_cache_stats['misses'] += 1
+    dst = _open_icc_profile(dst_source)
+    mode = out_mode or _profile_mode(dst) or 'RGB'
+    if mode == 'RGB' and in_mode == 'RGBA':
+        mode = 'RGBA'
+    transform = ImageCms.buildTransform(_open_icc_profile(src_source), dst, in_mode, mode,
+                                        renderingIntent=intent)
+    _ICC_TRANSFORMS[key] = transform
+    while len(_ICC_TRANSFORMS) > _ICC_TRANSFORM_CACHE_SIZE:
+        _ICC_TRANSFORMS.popitem(last=False)
+    return transform
+
+
+def icc_transform_cache_info():
+    """ICC 转换缓存的命中情况"""
+    return dict(_icc_cache_stats, size=len(_ICC_TRANSFORMS), max_size=_ICC_TRANSFORM_CACHE_SIZE)
+
+
+def convert_with_icc(img, dst_profile='sRGB', src_profile=None, out_mode=None,
+                     intent=ImageCms.Intent.PERCEPTUAL, in_place=False):
+    """
+    按 ICC 配置文件做颜色管理的转换（如 Adobe RGB / Display P3 / CMYK -> sRGB）
+    
+    同一源配置文件的大量图像共用一个缓存的转换，只在第一次时构建
+    
+    参数:
+        img: Image对象
+        dst_profile: 目标配置文件（'sRGB'/'LAB'/'XYZ'、路径、ICC 字节串或 ImageCmsProfile）
+        src_profile: 源配置文件，None 表示使用 img.info['icc_profile']；
+            没有嵌入配置文件时按 sRGB 处理（L/CMYK 图像直接用 convert 转为 RGB）
+        out_mode: 输出模式，None 表示按目标配置的色彩空间决定
+        intent: 渲染意图（ImageCms.Intent）
+        in_place: 输入输出模式相同时是否直接修改原图
+    
+    返回:
+        转换后的图像，info['icc_profile'] 为目标配置文件
+    """
+    if src_profile is None:
+        src_profile = img.info.get('icc_profile')
+        if not src_profile:
+            if img.mode in ('L', 'CMYK'):
+                print(f"ICC 转换: 没有嵌入配置文件，{img.mode} 直接转换为 RGB")
+                return img.convert(out_mode or 'RGB')
+            src_profile = 'LAB' if img.mode == 'LAB' else 'sRGB'
+    if img.mode not in ('RGB', 'RGBA', 'L', 'CMYK', 'LAB'):
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        in_place = True
+    transform = get_icc_transform(src_profile, dst_profile, img.mode, out_mode, intent)
+    print(f"ICC 转换: {transform.input_mode} -> {transform.output_mode}, "
+          f"缓存 {icc_transform_cache_info()['size']} 个转换")
+    if in_place and transform.input_mode == transform.output_mode:
+        ImageCms.applyTransform(img, transform, inPlace=True)
+        return img
+    return ImageCms.applyTransform(img, transform)
 
 
 def colorize_grayscale(img, black_color=(0, 0, 0), white_color=(255, 255, 255)):
@@ -344,5 +1809,61 @@ if __name__ == "__main__":
     colorized = colorize_grayscale(gray, (0, 0, 100), (255, 255, 150))
     save_image(colorized, "output/51_colorized.png")
     
+    # 12. 颜色矩阵合成：棕褐色 + 降低饱和度 + 色相旋转，一次转换完成
+    graded = apply_color_matrix(test_img, ColorMatrix.sepia(), ColorMatrix.saturation(0.6),
+                                ColorMatrix.hue_rotation(20))
+    save_image(graded, "output/51b_color_matrix.png")
+    
+    # 13. 逐点操作流水线：多步色调调整合成为一张查找表，只遍历一次图像
+    tone = PointPipeline().gamma(0.8).posterize(5).solarize(220).curve(
+        [min(255, int(v * 1.1)) for v in range(256)])
+    save_image(tone.apply(test_img), "output/51c_point_pipeline.png")
+    
+    # 14. 3D LUT 调色：生成"青橙"风格的 .cube 文件，加载（按内容哈希缓存）后批量应用
+    teal_orange = CubeLUT.from_function(
+        lambda r, g, b: (np.clip(r * 1.1, 0, 1), g, np.clip(b * 0.8 + (1 - r) * 0.2, 0, 1)),
+        size=33, title="Teal Orange")
+    teal_orange.save("output/teal_orange.cube")
+    lut = load_cube_lut("output/teal_orange.cube")
+    graded_batch = apply_3d_lut_batch([test_img, gamma_light, gamma_dark], lut)
+    save_image(graded_batch[0], "output/51d_lut_trilinear.png")
+    save_image(apply_3d_lut(test_img, lut, method='tetrahedral'), "output/51e_lut_tetrahedral.png")
+    
+    # 15. ICC 颜色管理：同一配置文件的多幅图像共用一个缓存的转换
+    srgb_bytes = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    for frame in (test_img, gamma_light, gamma_dark):
+        frame.info['icc_profile'] = srgb_bytes
+        lab = convert_with_icc(frame, 'LAB')
+    save_image(convert_with_icc(lab, 'sRGB'), "output/51f_icc_roundtrip.png")
+    print(f"ICC 转换缓存: {icc_transform_cache_info()}")
+    
+    # 16. 调色板映射：映射到 8 色品牌调色板（无抖动 / 有序抖动）
+    brand = [(0, 0, 0), (255, 255, 255), (231, 76, 60), (46, 204, 113),
+             (52, 152, 219), (241, 196, 15), (155, 89, 182), (52, 73, 94)]
+    save_image(map_to_palette(test_img, brand), "output/51g_palette.png")
+    save_image(map_to_palette(test_img, brand, dither=True, as_palette_image=True),
+               "output/51h_palette_dither.png")
+    
+    # 17. CLAHE：先压暗（adjust_gamma 按 输入^(1/gamma) 映射，gamma=0.4 使平均亮度从约 127 降到约 69），
+    # 再只做局部对比度增强，不像全局均衡化那样放大噪声
+    dark = adjust_gamma(test_img, gamma=0.4)
+    save_image(apply_clahe(dark, clip_limit=2.0, grid_size=(8, 8)), "output/51i_clahe.png")
+    
+    # 18. HSV/HSL/Lab 调整：色相旋转、饱和度和亮度
+    save_image(rotate_hue(test_img, 90), "output/51j_hue_rotated.png")
+    for degrees in (0, 360):
+        print(f"色相旋转 {degrees}° 保持原图: {rotate_hue(test_img, degrees).tobytes() == test_img.tobytes()}")
+    save_image(adjust_hsl(test_img, hue_shift=-30, saturation=1.3), "output/51k_hsl_adjusted.png")
+    save_image(adjust_lightness(test_img, 1.25), "output/51l_lab_lightness.png")
+    
+    # 19. 多目标颜色遮罩 + 连通域统计：找出映射到品牌色后的红色和绿色色块
+    posterized = map_to_palette(test_img, brand)
+    save_image(create_multi_color_mask(posterized, [brand[2], brand[3]], tolerance=0),
+               "output/51m_multi_color_mask.png")
+    blobs = find_color_blobs(posterized, [brand[2], brand[3]], tolerance=0, min_area=50)
+    for blob in blobs[:5]:
+        print(f"  色块 {blob['label']}: 面积 {blob['area']}, 边界框 {blob['bbox']}, "
+              f"质心 ({blob['centroid'][0]:.1f}, {blob['centroid'][1]:.1f})")
+    
     print("\n所有颜色操作示例已完成！请查看 output/ 目录")
 
@@ -3,10 +3,96 @@
 包含图像混合、粘贴、透明度处理等功能
 """
 
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
 from PIL import Image, ImageChops
 
 
-def paste_image(background, foreground, position=(0, 0), mask=None):
+class PreparedLayer:
+    """
+    预处理过的叠加图层
+    
+    同一个叠加层要合成到大量底图上时，blend_images 等函数每次都要把它缩放、转换到底图的
+    尺寸和模式。用 PreparedLayer 包装后，每种目标 (尺寸, 模式) 只处理一次，结果按 LRU 缓存，
+    可以直接代替原始图像传给本模块的合成函数。
+    
+    用法:
+        logo = PreparedLayer(Image.open("logo.png"))
+        for photo in photos:
+            result = blend_images(photo, logo, alpha=0.3)   # 同尺寸的照片共用一次缩放
+    """
+    
+    def __init__(self, image, resample=Image.LANCZOS, max_entries=8):
+        """
+        参数:
+            image: 原始图层图像
+            resample: 缩放时使用的重采样滤镜
+            max_entries: 最多缓存的目标 (尺寸, 模式) 组合数
+        """
+        self.image = image
+        self.resample = resample
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+    
+    @property
+    def size(self):
+        return self.image.size
+    
+    @property
+    def mode(self):
+        return self.image.mode
+    
+    def for_target(self, size, mode, convert_first=False):
+        """
+        返回缩放到 size、转换为 mode 的图层（缓存结果，调用方不应修改它）
+        
+        参数:
+            size: 目标尺寸
+            mode: 目标模式
+            convert_first: 是否先转换模式再缩放（默认先缩放，与各合成函数原有的处理顺序一致）
+        """
+        key = (tuple(size), mode, convert_first)
+        prepared = self._cache.get(key)
+        if prepared is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return prepared
+        self.misses += 1
+        prepared = self.image
+        if convert_first and prepared.mode != mode:
+            prepared = prepared.convert(mode)
+        if prepared.size != tuple(size):
+            prepared = prepared.resize(size, self.resample)
+        if prepared.mode != mode:
+            prepared = prepared.convert(mode)
+        self._cache[key] = prepared
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return prepared
+    
+    def stats(self):
+        """缓存统计"""
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}
+
+
+def _match_layer(layer, size, mode, convert_first=False):
+    """把图层调整为指定尺寸和模式；PreparedLayer 使用其缓存的结果"""
+    if isinstance(layer, PreparedLayer):
+        return layer.for_target(size, mode, convert_first)
+    if convert_first and layer.mode != mode:
+        layer = layer.convert(mode)
+    if layer.size != size:
+        layer = layer.resize(size, Image.LANCZOS)
+    if layer.mode != mode:
+        layer = layer.convert(mode)
+    return layer
+
+
+def paste_image(background, foreground, position=(0, 0), mask=None, in_place=False):
     """
     将一个图像粘贴到另一个图像上
     
@@ -15,23 +101,65 @@ def paste_image(background, foreground, position=(0, 0), mask=None):
         foreground: 前景图像
         position: 粘贴位置 (x, y)
         mask: 遮罩图像
+        in_place: 是否直接修改背景图像（不复制整幅背景，代价只与前景大小有关）
     
     返回:
         合成后的图像
     """
     print(f"粘贴图像到位置 {position}")
-    result = background.copy()
+    result = background if in_place else background.copy()
     result.paste(foreground, position, mask)
     return result
 
 
+def composite_region(background, overlay, position=(0, 0), in_place=False):
+    """
+    把带透明度的小图层 alpha 合成到背景的指定位置，只处理图层覆盖的区域
+    
+    结果与先创建整幅透明图层再 Image.alpha_composite 相同，
+    但合成代价与图层大小成正比（适合在大图上添加水印、标签）
+    
+    参数:
+        background: 背景图像（RGB 或 RGBA）
+        overlay: 叠加图层（或 PreparedLayer，按自身尺寸使用），会转换为 RGBA
+        position: 图层左上角在背景中的位置 (x, y)，可以为负或超出背景
+        in_place: 是否直接修改背景图像
+    
+    返回:
+        合成后的图像（与背景模式相同）
+    """
+    print(f"区域合成: {overlay.size[0]}x{overlay.size[1]} 图层到位置 {position}")
+    if background.mode not in ('RGB', 'RGBA'):
+        raise ValueError(f"区域合成只支持 RGB/RGBA 背景，当前为 {background.mode}")
+    layer = _match_layer(overlay, overlay.size, 'RGBA')
+    result = background if in_place else background.copy()
+    
+    # 图层与背景的交集（背景坐标）
+    x, y = position
+    left, top = max(x, 0), max(y, 0)
+    right = min(x + layer.width, result.width)
+    bottom = min(y + layer.height, result.height)
+    if left >= right or top >= bottom:
+        return result
+    source = (left - x, top - y, right - x, bottom - y)
+    
+    if result.mode == 'RGBA':
+        result.alpha_composite(layer, dest=(left, top), source=source)
+    else:
+        box = (left, top, right, bottom)
+        region = result.crop(box).convert('RGBA')
+        region.alpha_composite(layer, source=source)
+        result.paste(region.convert('RGB'), box)
+    return result
+
+
 def blend_images(img1, img2, alpha=0.5):
     """
     混合两个图像
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
         alpha: 混合系数 (0.0 = 完全是img1, 1.0 = 完全是img2)
     
     返回:
@@ -39,13 +167,8 @@ def blend_images(img1, img2, alpha=0.5):
     """
     print(f"混合图像: alpha = {alpha}")
     
-    # 确保两个图像大小相同
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    
-    # 确保两个图像模式相同
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    # 确保两个图像大小和模式相同
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return Image.blend(img1, img2, alpha)
 
@@ -56,25 +179,17 @@ def composite_images(img1, img2, mask):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
-        mask: 遮罩图像（L模式或1模式）
+        img2: 第二个图像（或 PreparedLayer）
+        mask: 遮罩图像（L模式或1模式，或 PreparedLayer）
     
     返回:
         合成后的图像
     """
     print("使用遮罩合成图像")
     
-    # 确保图像大小相同
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if mask.size != img1.size:
-        mask = mask.resize(img1.size, Image.LANCZOS)
-    
-    # 确保模式相同
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
-    if mask.mode != 'L':
-        mask = mask.convert('L')
+    # 确保图像和遮罩的大小、模式相同
+    img2 = _match_layer(img2, img1.size, img1.mode)
+    mask = _match_layer(mask, img1.size, 'L')
     
     return Image.composite(img1, img2, mask)
 
@@ -85,7 +200,7 @@ def add_images(img1, img2, scale=1.0, offset=0):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
         scale: 缩放因子
         offset: 偏移量
     
@@ -94,10 +209,7 @@ def add_images(img1, img2, scale=1.0, offset=0):
     """
     print(f"相加图像: scale={scale}, offset={offset}")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.add(img1, img2, scale, offset)
 
@@ -108,7 +220,7 @@ def subtract_images(img1, img2, scale=1.0, offset=0):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
         scale: 缩放因子
         offset: 偏移量
     
@@ -117,10 +229,7 @@ def subtract_images(img1, img2, scale=1.0, offset=0):
     """
     print(f"相减图像: scale={scale}, offset={offset}")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.subtract(img1, img2, scale, offset)
 
@@ -131,17 +240,14 @@ def multiply_images(img1, img2):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
     
     返回:
         相乘后的图像
     """
     print("相乘图像（正片叠底）")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.multiply(img1, img2)
 
@@ -152,17 +258,14 @@ def screen_images(img1, img2):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
     
     返回:
         混合后的图像
     """
     print("屏幕混合模式")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.screen(img1, img2)
 
@@ -173,17 +276,14 @@ def lighter_images(img1, img2):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
     
     返回:
         合成后的图像
     """
     print("取较亮像素")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.lighter(img1, img2)
 
@@ -194,17 +294,14 @@ def darker_images(img1, img2):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
     
     返回:
         合成后的图像
     """
     print("取较暗像素")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.darker(img1, img2)
 
@@ -215,17 +312,14 @@ def difference_images(img1, img2):
     
     参数:
         img1: 第一个图像
-        img2: 第二个图像
+        img2: 第二个图像（或 PreparedLayer）
     
     返回:
         差异图像
     """
     print("计算图像差异")
     
-    if img1.size != img2.size:
-        img2 = img2.resize(img1.size, Image.LANCZOS)
-    if img1.mode != img2.mode:
-        img2 = img2.convert(img1.mode)
+    img2 = _match_layer(img2, img1.size, img1.mode)
     
     return ImageChops.difference(img1, img2)
 
@@ -236,7 +330,7 @@ def create_alpha_composite(img1, img2):
     
     参数:
         img1: 第一个图像（RGBA）
-        img2: 第二个图像（RGBA）
+        img2: 第二个图像（RGBA，或 PreparedLayer）
     
     返回:
         合成后的图像
@@ -244,74 +338,462 @@ def create_alpha_composite(img1, img2):
     print("Alpha通道合成")
     
     img1_rgba = img1.convert('RGBA')
-    img2_rgba = img2.convert('RGBA')
-    
-    if img1_rgba.size != img2_rgba.size:
-        img2_rgba = img2_rgba.resize(img1_rgba.size, Image.LANCZOS)
+    img2_rgba = _match_layer(img2, img1_rgba.size, 'RGBA', convert_first=True)
     
     return Image.alpha_composite(img1_rgba, img2_rgba)
 
 
-def create_gradient_mask(width, height, direction='horizontal'):
+def _soft_light(backdrop, source):
+    darken = backdrop - (1 - 2 * source) * backdrop * (1 - backdrop)
+    lift = np.where(backdrop <= 0.25, ((16 * backdrop - 12) * backdrop + 4) * backdrop, np.sqrt(backdrop))
+    return np.where(source <= 0.5, darken, backdrop + (2 * source - 1) * (lift - backdrop))
+
+
+def _hard_light(backdrop, source):
+    doubled = 2 * source
+    return np.where(source <= 0.5, backdrop * doubled,
+                    backdrop + (doubled - 1) - backdrop * (doubled - 1))
+
+
+# 可分离混合模式 B(底色, 图层色)，取值范围 0-1（W3C Compositing and Blending 规范）
+BLEND_MODES = {
+    'normal': lambda backdrop, source: source,
+    'multiply': lambda backdrop, source: backdrop * source,
+    'screen': lambda backdrop, source: backdrop + source - backdrop * source,
+    'overlay': lambda backdrop, source: _hard_light(source, backdrop),
+    'soft_light': _soft_light,
+    'hard_light': _hard_light,
+    'darken': np.minimum,
+    'lighten': np.maximum,
+    'difference': lambda backdrop, source: np.abs(backdrop - source),
+}
+
+
+class Layer:
+    """
+    图层栈中的一个图层
+    
+    属性:
+        image: 图层图像（透明度参与合成）
+        blend_mode: 混合模式，见 BLEND_MODES
+        opacity: 不透明度 0-1
+        offset: 图层左上角在画布上的位置 (x, y)，可以为负或超出画布
+        mask: 图层遮罩（L 图像或 PreparedLayer，按图层尺寸缩放），None 表示不使用
+    """
+    
+    def __init__(self, image, blend_mode='normal', opacity=1.0, offset=(0, 0), mask=None):
+        if blend_mode not in BLEND_MODES:
+            raise ValueError(f"未知的混合模式: {blend_mode}，可选: {', '.join(BLEND_MODES)}")
+        self.image = image
+        self.blend_mode = blend_mode
+        self.opacity = opacity
+        self.offset = tuple(offset)
+        self.mask = mask
+
+
+def _blend_layer(canvas, layer):
+    """把一个图层按混合模式合成到工作缓冲区（只处理图层与画布相交的区域）"""
+    height, width = canvas.shape[:2]
+    x, y = layer.offset
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + layer.image.width, width), min(y + layer.image.height, height)
+    if left >= right or top >= bottom or layer.opacity <= 0:
+        return
+    box = (left - x, top - y, right - x, bottom - y)
+    source = np.asarray(layer.image.convert('RGBA').crop(box), dtype=np.float32) / 255
+    source_alpha = source[..., 3] * layer.opacity
+    if layer.mask is not None:
+        mask = _match_layer(layer.mask, layer.image.size, 'L').crop(box)
+        source_alpha *= np.asarray(mask, dtype=np.float32) / 255
+    
+    region = canvas[top:bottom, left:right]
+    backdrop = region.astype(np.float32) / 255
+    backdrop_alpha = backdrop[..., 3]
+    blended = BLEND_MODES[layer.blend_mode](backdrop[..., :3], source[..., :3])
+    
+    # 底色透明处显示图层原色，不透明处显示混合结果；再与底色按源透明度做 source-over
+    source_alpha = source_alpha[..., np.newaxis]
+    backdrop_alpha = backdrop_alpha[..., np.newaxis]
+    mixed = source[..., :3] + backdrop_alpha * (blended - source[..., :3])
+    out_alpha = source_alpha + backdrop_alpha * (1 - source_alpha)
+    color = source_alpha * mixed + (1 - source_alpha) * backdrop_alpha * backdrop[..., :3]
+    np.divide(color, out_alpha, out=color, where=out_alpha > 0)
+    region[..., :3] = np.rint(np.clip(color, 0, 1) * 255)
+    region[..., 3] = np.rint(out_alpha[..., 0] * 255)
+
+
+def composite_layers(base, layers):
+    """
+    把多个图层一次性合成到底图上
+    
+    所有图层累加到同一个工作缓冲区中，每个图层只处理它与画布相交的边界框，
+    不为每一层生成整幅的中间图像
+    
+    参数:
+        base: 底图（RGB 输出 RGB，其他模式输出 RGBA）
+        layers: Layer 对象（或图像，按 normal 模式、不透明度 1、位置 (0, 0) 处理）的列表，
+            从下到上排列
+    
+    返回:
+        合成后的图像
+    """
+    layers = [layer if isinstance(layer, Layer) else Layer(layer) for layer in layers]
+    print(f"合成图层栈: {len(layers)} 个图层 ({', '.join(layer.blend_mode for layer in layers)})")
+    canvas = np.array(base.convert('RGBA'))
+    for layer in layers:
+        _blend_layer(canvas, layer)
+    if base.mode == 'RGB':
+        return Image.fromarray(canvas[..., :3], 'RGB')
+    return Image.fromarray(canvas, 'RGBA')
+
+
+def _rgb_to_chroma(color):
+    """RGB 颜色的 (Cb, Cr)（与 Pillow 的 YCbCr 转换相同的系数）"""
+    r, g, b = color[:3]
+    return (128 - 0.168736 * r - 0.331264 * g + 0.5 * b,
+            128 + 0.5 * r - 0.418688 * g - 0.081312 * b)
+
+
+@lru_cache(maxsize=16)
+def _chroma_key_tables(key_cb, key_cr, tolerance, softness, spill):
+    """
+    以 (Cb, Cr) 为下标（Cb x 256 + Cr）的 65536 项查找表
+    
+    返回:
+        (alpha, delta)：alpha 为 uint8 透明度；delta 为 (65536, 3) int16，
+        是去除溢色后 R, G, B 的变化量，没有溢色的位置为 0
+    """
+    cb, cr = np.meshgrid(np.arange(256.0), np.arange(256.0), indexing='ij')
+    distance = np.hypot(cb - key_cb, cr - key_cr)
+    alpha = np.clip((distance - tolerance) / max(softness, 1e-6), 0, 1)
+    alpha = np.rint(alpha * 255).astype(np.uint8).ravel()
+    
+    # 溢色抑制：去掉色度在抠像色方向上的正分量（亮度 Y 不变）
+    axis = np.array([key_cb - 128, key_cr - 128])
+    norm = np.hypot(*axis)
+    delta = np.zeros((256 * 256, 3), dtype=np.int16)
+    if spill > 0 and norm > 0:
+        axis /= norm
+        amount = spill * np.maximum((cb - 128) * axis[0] + (cr - 128) * axis[1], 0).ravel()
+        d_cb, d_cr = -amount * axis[0], -amount * axis[1]
+        delta[:, 0] = np.rint(1.402 * d_cr)
+        delta[:, 1] = np.rint(-0.344136 * d_cb - 0.714136 * d_cr)
+        delta[:, 2] = np.rint(1.772 * d_cb)
+    for table in (alpha, delta):
+        table.flags.writeable = False
+    return alpha, delta
+
+
+class ChromaKeyer:
+    """
+    色度抠像（绿幕/蓝幕）
+    
+    在 YCbCr 的色度平面上按到抠像色的距离计算柔和的透明度，并抑制溢色。
+    透明度和溢色修正都预先算成以 (Cb, Cr) 为下标的查找表，每帧只需查表，
+    与背景的合成用一次 Image.composite 完成；背景按帧尺寸缩放一次后复用。
+    
+    用法:
+        keyer = ChromaKeyer(key_color=(0, 177, 64), background=studio)
+        for frame in frames:
+            result = keyer.apply(frame)
+    """
+    
+    def __init__(self, key_color=(0, 177, 64), tolerance=40, softness=30, spill=1.0, background=None):
+        """
+        参数:
+            key_color: 抠像色（最好从幕布上取样）
+            tolerance: 色度距离小于该值的像素完全透明
+            softness: 过渡带宽度，距离在 tolerance 到 tolerance + softness 之间时半透明
+            spill: 溢色抑制强度（0 表示不处理，1 表示完全去除抠像色方向的色度）
+            background: 背景图像（或 PreparedLayer），None 表示输出带透明通道的 RGBA 图像
+        """
+        self.key_color = tuple(key_color[:3])
+        self.tolerance = tolerance
+        self.softness = softness
+        self.spill = spill
+        if background is not None and not isinstance(background, PreparedLayer):
+            background = PreparedLayer(background)
+        self.background = background
+        key_cb, key_cr = _rgb_to_chroma(self.key_color)
+        self._alpha_table, self._delta_table = _chroma_key_tables(
+            round(key_cb, 3), round(key_cr, 3), float(tolerance), float(softness), float(spill))
+    
+    def key(self, frame):
+        """
+        抠像
+        
+        参数:
+            frame: 前景图像
+        
+        返回:
+            (去除溢色后的 RGB 图像, 透明度遮罩 L 图像)
+        """
+        rgb = frame.convert('RGB')
+        ycbcr = np.asarray(rgb.convert('YCbCr'))
+        index = (ycbcr[..., 1].astype(np.uint16) << 8) | ycbcr[..., 2]
+        alpha = Image.fromarray(self._alpha_table.take(index), 'L')
+        if not self.spill:
+            return rgb, alpha
+        pixels = np.asarray(rgb).astype(np.int16)
+        pixels += self._delta_table.take(index, axis=0)
+        np.clip(pixels, 0, 255, out=pixels)
+        return Image.fromarray(pixels.astype(np.uint8), 'RGB'), alpha
+    
+    def _background_for(self, size):
+        """按帧尺寸缩放并转换背景，结果缓存复用"""
+        return self.background.for_target(size, 'RGB', convert_first=True)
+    
+    def apply(self, frame):
+        """
+        抠像并合成到背景上
+        
+        参数:
+            frame: 前景图像
+        
+        返回:
+            合成后的 RGB 图像；没有背景时返回 RGBA 图像
+        """
+        foreground, alpha = self.key(frame)
+        if self.background is None:
+            foreground.putalpha(alpha)
+            return foreground
+        return Image.composite(foreground, self._background_for(foreground.size), alpha)
+    
+    def apply_batch(self, frames):
+        """
+        依次处理多帧（查找表和缩放后的背景在各帧间复用）
+        
+        参数:
+            frames: 前景图像的可迭代对象
+        
+        返回:
+            生成器，依次产出合成结果
+        """
+        print(f"批量色度抠像: 抠像色 {self.key_color}")
+        for frame in frames:
+            yield self.apply(frame)
+
+
+def chroma_key(foreground, background=None, key_color=(0, 177, 64), tolerance=40, softness=30,
+               spill=1.0):
+    """
+    色度抠像并合成（绿幕/蓝幕）
+    
+    参数:
+        foreground: 前景图像
+        background: 背景图像（或 PreparedLayer），None 表示返回带透明通道的 RGBA 图像
+        key_color: 抠像色
+        tolerance: 完全透明的色度距离
+        softness: 半透明过渡带宽度
+        spill: 溢色抑制强度（0-1）
+    
+    返回:
+        合成后的图像
+    """
+    print(f"色度抠像: 抠像色 {key_color}, 容差 {tolerance}, 过渡 {softness}, 溢色抑制 {spill}")
+    keyer = ChromaKeyer(key_color, tolerance, softness, spill, background)
+    return keyer.apply(foreground)
+
+
+# 羽化曲线：t 为从边缘向内的归一化位置（0 为边缘，1 为完全不透明）
+FEATHER_CURVES = {
+    'linear': lambda t: t,
+    'smooth': lambda t: t * t * (3 - 2 * t),
+    'ease_in': lambda t: t * t,
+    'ease_out': lambda t: 1 - (1 - t) * (1 - t),
+}
+
+
+def _check_curve(curve):
+    if curve not in FEATHER_CURVES:
+        raise ValueError(f"未知的羽化曲线: {curve}，可选: {', '.join(FEATHER_CURVES)}")
+
+
+def _feathered_alpha(distance, radius, feather, curve):
+    """
+    distance <= radius 的像素在形状内；离边缘 feather 以内的部分按曲线羽化
+    
+    计算式与原先逐像素的圆形遮罩相同：int(255 * (1 - (distance - (radius - feather)) / feather))
+    """
+    inside = distance <= radius
+    if feather <= 0:
+        return np.where(inside, 255, 0).astype(np.uint8)
+    edge = inside & (distance > radius - feather)
+    t = 1 - (distance[edge] - (radius - feather)) / feather
+    alpha = np.where(inside, 255, 0).astype(np.uint8)
+    alpha[edge] = (255 * FEATHER_CURVES[curve](t)).astype(np.uint8)
+    return alpha
+
+
+# 形状遮罩缓存：按参数 LRU 淘汰，总字节数不超过预算；单个超过预算的遮罩不缓存
+_MASK_CACHE = OrderedDict()
+_MASK_CACHE_MAX_BYTES = 64 * 2 ** 20
+_mask_cache_bytes = 0
+
+
+def _cached_mask(key, build):
+    """取出或生成遮罩，返回独立的副本（不与缓存共享像素缓冲区）"""
+    global _mask_cache_bytes
+    mask = _MASK_CACHE.get(key)
+    if mask is not None:
+        _MASK_CACHE.move_to_end(key)
+        return mask.copy()
+    mask = build()
+    nbytes = mask.width * mask.height
+    if nbytes <= _MASK_CACHE_MAX_BYTES:
+        _MASK_CACHE[key] = mask
+        _mask_cache_bytes += nbytes
+        while _mask_cache_bytes > _MASK_CACHE_MAX_BYTES:
+            _, evicted = _MASK_CACHE.popitem(last=False)
+            _mask_cache_bytes -= evicted.width * evicted.height
+    return mask.copy()
+
+
+def mask_cache_info():
+    """形状遮罩缓存的条目数、字节数和字节预算"""
+    return {'entries': len(_MASK_CACHE), 'bytes': _mask_cache_bytes,
+            'max_bytes': _MASK_CACHE_MAX_BYTES}
+
+
+@lru_cache(maxsize=32)
+def _gradient_profile(length, curve):
+    """渐变的一维剖面（bytes，不可变），整幅遮罩在每次调用时由它展开"""
+    positions = np.arange(length)
+    if curve == 'linear':
+        # 与 int(255 * x / width) 相同（整数除法避免浮点误差）
+        values = (255 * positions // length).astype(np.uint8)
+    else:
+        values = (255 * FEATHER_CURVES[curve](positions / length)).astype(np.uint8)
+    return values.tobytes()
+
+
+def create_gradient_mask(width, height, direction='horizontal', curve='linear'):
     """
-    创建渐变遮罩
+    创建渐变遮罩（只缓存一维剖面，每次调用按最近邻展开为新图像）
     
     参数:
         width: 宽度
         height: 高度
         direction: 渐变方向 ('horizontal' 或 'vertical')
+        curve: 渐变曲线（见 FEATHER_CURVES）
     
     返回:
         渐变遮罩图像
     """
     print(f"创建渐变遮罩: {direction}")
-    mask = Image.new('L', (width, height))
-    
-    for y in range(height):
-        for x in range(width):
-            if direction == 'horizontal':
-                value = int(255 * x / width)
-            else:  # vertical
-                value = int(255 * y / height)
-            mask.putpixel((x, y), value)
-    
-    return mask
+    _check_curve(curve)
+    if direction == 'horizontal':
+        profile = Image.frombytes('L', (width, 1), _gradient_profile(width, curve))
+    else:
+        profile = Image.frombytes('L', (1, height), _gradient_profile(height, curve))
+    return profile.resize((width, height), Image.NEAREST)
+
 
+def _circular_mask(width, height, center, radius, feather, curve):
+    x = np.arange(width, dtype=np.float64) - center[0]
+    y = np.arange(height, dtype=np.float64)[:, np.newaxis] - center[1]
+    distance = np.sqrt(x * x + y * y)
+    return Image.fromarray(_feathered_alpha(distance, radius, feather, curve), 'L')
 
-def create_circular_mask(width, height, center=None, radius=None):
+
+def create_circular_mask(width, height, center=None, radius=None, feather=10, curve='linear'):
     """
-    创建圆形遮罩
+    创建圆形遮罩（向量化生成，相同参数的结果按字节预算 LRU 缓存，返回的是独立副本）
     
     参数:
         width: 宽度
         height: 高度
         center: 圆心位置，默认为图像中心
         radius: 半径，默认为图像最短边的一半
+        feather: 羽化宽度（像素），0 表示硬边
+        curve: 羽化曲线（见 FEATHER_CURVES）
     
     返回:
         圆形遮罩图像
     """
     print("创建圆形遮罩")
+    _check_curve(curve)
     
     if center is None:
         center = (width // 2, height // 2)
     if radius is None:
         radius = min(width, height) // 2
     
-    mask = Image.new('L', (width, height), 0)
+    args = (width, height, tuple(center), radius, feather, curve)
+    return _cached_mask(('circle',) + args, lambda: _circular_mask(*args))
+
+
+def _elliptical_mask(width, height, center, radii, feather, curve):
+    rx, ry = radii
+    x = (np.arange(width, dtype=np.float64) - center[0])[np.newaxis, :]
+    y = (np.arange(height, dtype=np.float64) - center[1])[:, np.newaxis]
+    # 有向距离的一阶近似：(|p|_椭圆 - 1) / |梯度|，在圆上即为精确距离
+    norm = np.sqrt((x / rx) ** 2 + (y / ry) ** 2)
+    gradient = np.sqrt((x / (rx * rx)) ** 2 + (y / (ry * ry)) ** 2)
+    safe = np.where(gradient > 0, gradient, 1)
+    distance = np.where(gradient > 0, (norm - 1) * norm / safe, -min(rx, ry))
+    return Image.fromarray(_feathered_alpha(distance, 0, feather, curve), 'L')
+
+
+def create_elliptical_mask(width, height, center=None, radii=None, feather=10, curve='linear'):
+    """
+    创建椭圆遮罩（向量化生成，相同参数的结果按字节预算 LRU 缓存，返回的是独立副本）
     
-    for y in range(height):
-        for x in range(width):
-            distance = ((x - center[0]) ** 2 + (y - center[1]) ** 2) ** 0.5
-            if distance <= radius:
-                # 创建羽化边缘
-                if distance > radius - 10:
-                    alpha = int(255 * (1 - (distance - (radius - 10)) / 10))
-                else:
-                    alpha = 255
-                mask.putpixel((x, y), alpha)
+    参数:
+        width: 宽度
+        height: 高度
+        center: 中心位置，默认为图像中心
+        radii: 半轴长 (rx, ry)，默认为图像宽高的一半
+        feather: 羽化宽度（像素），0 表示硬边
+        curve: 羽化曲线（见 FEATHER_CURVES）
     
-    return mask
+    返回:
+        椭圆遮罩图像
+    """
+    print("创建椭圆遮罩")
+    _check_curve(curve)
+    if center is None:
+        center = (width / 2, height / 2)
+    if radii is None:
+        radii = (width / 2, height / 2)
+    args = (width, height, tuple(center), tuple(radii), feather, curve)
+    return _cached_mask(('ellipse',) + args, lambda: _elliptical_mask(*args))
+
+
+def _rounded_rect_mask(width, height, box, corner_radius, feather, curve):
+    left, top, right, bottom = box
+    half_w, half_h = (right - left) / 2, (bottom - top) / 2
+    corner = min(corner_radius, half_w, half_h)
+    # 圆角矩形的有向距离场（内部为负）
+    qx = np.abs(np.arange(width, dtype=np.float64) + 0.5 - (left + right) / 2) - (half_w - corner)
+    qy = np.abs(np.arange(height, dtype=np.float64) + 0.5 - (top + bottom) / 2) - (half_h - corner)
+    qx, qy = qx[np.newaxis, :], qy[:, np.newaxis]
+    outside = np.hypot(np.maximum(qx, 0), np.maximum(qy, 0))
+    distance = outside + np.minimum(np.maximum(qx, qy), 0) - corner
+    return Image.fromarray(_feathered_alpha(distance, 0, feather, curve), 'L')
+
+
+def create_rounded_rect_mask(width, height, box=None, corner_radius=20, feather=0, curve='linear'):
+    """
+    创建圆角矩形遮罩（向量化生成，相同参数的结果按字节预算 LRU 缓存，返回的是独立副本）
+    
+    参数:
+        width: 宽度
+        height: 高度
+        box: 矩形 (left, top, right, bottom)，默认为整幅图像
+        corner_radius: 圆角半径
+        feather: 羽化宽度（像素），0 表示硬边
+        curve: 羽化曲线（见 FEATHER_CURVES）
+    
+    返回:
+        圆角矩形遮罩图像
+    """
+    print(f"创建圆角矩形遮罩: 圆角 {corner_radius}, 羽化 {feather}")
+    _check_curve(curve)
+    if box is None:
+        box = (0, 0, width, height)
+    args = (width, height, tuple(box), corner_radius, feather, curve)
+    return _cached_mask(('rounded_rect',) + args, lambda: _rounded_rect_mask(*args))
 
 
 # 示例使用
@@ -379,5 +861,47 @@ if __name__ == "__main__":
     pasted = paste_image(img1, small_img, position=(150, 100))
     save_image(pasted, "output/64_pasted.png")
     
+    # 区域合成：半透明标签只在自身覆盖的区域内合成（部分超出右下角）
+    label = Image.new('RGBA', (120, 40), (255, 255, 255, 160))
+    save_image(composite_region(img1, label, position=(320, 280)), "output/64_region_composite.png")
+    
+    # 6. 色度抠像：绿幕前的圆形"主体"合成到渐变背景上
+    from PIL import ImageDraw
+    green_screen = create_new_image(400, 300, (0, 177, 64))
+    ImageDraw.Draw(green_screen).ellipse([120, 70, 280, 230], fill=(230, 180, 60),
+                                         outline=(90, 190, 90), width=4)
+    keyed = chroma_key(green_screen, img1, key_color=(0, 177, 64))
+    save_image(keyed, "output/65_chroma_key.png")
+    
+    # 批量模式：查找表和缩放后的背景在多帧之间复用
+    keyer = ChromaKeyer(key_color=(0, 177, 64), background=img2)
+    for i, frame in enumerate(keyer.apply_batch([green_screen, green_screen.rotate(90)])):
+        save_image(frame, f"output/66_chroma_key_batch_{i}.png")
+    
+    # 7. 预处理图层：同一个叠加层合成到多张底图上，只缩放/转换一次
+    overlay = PreparedLayer(create_gradient_image(200, 150))
+    for i, base in enumerate([img1, img2, img1.transpose(Image.FLIP_LEFT_RIGHT)]):
+        save_image(blend_images(base, overlay, alpha=0.4), f"output/67_prepared_blend_{i}.png")
+    print(f"预处理图层缓存: {overlay.stats()}")
+    
+    # 8. 图层栈：多个图层按各自的混合模式、不透明度、位置和遮罩一次合成
+    swatch = create_new_image(160, 120, (255, 180, 40))
+    flattened = composite_layers(img1, [
+        Layer(swatch, 'multiply', offset=(20, 20)),
+        Layer(swatch, 'screen', opacity=0.8, offset=(120, 60)),
+        Layer(swatch, 'overlay', offset=(220, 100), mask=create_circular_mask(160, 120)),
+        Layer(img2, 'soft_light', opacity=0.5, offset=(-200, 200)),
+        Layer(small_img, 'difference', offset=(330, 240)),
+    ])
+    save_image(flattened, "output/68_layer_stack.png")
+    
+    # 9. 更多遮罩形状与羽化曲线（相同参数的遮罩只生成一次）
+    ellipse_mask = create_elliptical_mask(400, 300, radii=(180, 110), feather=40, curve='smooth')
+    save_image(composite_images(img1, img2, ellipse_mask), "output/69_composite_elliptical.png")
+    
+    card_mask = create_rounded_rect_mask(400, 300, box=(40, 30, 360, 270), corner_radius=36,
+                                         feather=6, curve='ease_out')
+    save_image(composite_images(img1, img2, card_mask), "output/70_composite_rounded_rect.png")
+    
     print("\n所有合成示例已完成！请查看 output/ 目录")
 
@@ -3,10 +3,15 @@
 包含在图像上绘制线条、矩形、圆形、文字等功能
 """
 
-from PIL import Image, ImageDraw, ImageFont
+import math
+from collections import OrderedDict
+from functools import lru_cache
 
+import numpy as np
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 
-def draw_line(img, start, end, fill=(255, 0, 0), width=1):
+
+def draw_line(img, start, end, fill=(255, 0, 0), width=1, antialias=False):
     """
     在图像上绘制线条
     
@@ -16,11 +21,14 @@ def draw_line(img, start, end, fill=(255, 0, 0), width=1):
         end: 终点坐标 (x, y)
         fill: 线条颜色
         width: 线条宽度
+        antialias: 是否抗锯齿（只在图形边界框内超采样）
     
     返回:
         绘制后的Image对象
     """
     print(f"绘制线条: {start} -> {end}, 颜色: {fill}, 宽度: {width}")
+    if antialias:
+        return Canvas(img, antialias=True).line(start, end, fill=fill, width=width).image
     img_copy = img.copy()
     draw = ImageDraw.Draw(img_copy)
     draw.line([start, end], fill=fill, width=width)
@@ -48,7 +56,7 @@ def draw_rectangle(img, xy, fill=None, outline=(255, 0, 0), width=1):
     return img_copy
 
 
-def draw_circle(img, center, radius, fill=None, outline=(255, 0, 0), width=1):
+def draw_circle(img, center, radius, fill=None, outline=(255, 0, 0), width=1, antialias=False):
     """
     在图像上绘制圆形
     
@@ -59,11 +67,14 @@ def draw_circle(img, center, radius, fill=None, outline=(255, 0, 0), width=1):
         fill: 填充颜色
         outline: 边框颜色
         width: 边框宽度
+        antialias: 是否抗锯齿（只在图形边界框内超采样）
     
     返回:
         绘制后的Image对象
     """
     print(f"绘制圆形: 中心 {center}, 半径 {radius}, 填充: {fill}, 边框: {outline}")
+    if antialias:
+        return Canvas(img, antialias=True).circle(center, radius, fill=fill, outline=outline, width=width).image
     img_copy = img.copy()
     draw = ImageDraw.Draw(img_copy)
     
@@ -74,7 +85,7 @@ def draw_circle(img, center, radius, fill=None, outline=(255, 0, 0), width=1):
     return img_copy
 
 
-def draw_ellipse(img, bbox, fill=None, outline=(255, 0, 0), width=1):
+def draw_ellipse(img, bbox, fill=None, outline=(255, 0, 0), width=1, antialias=False):
     """
     在图像上绘制椭圆
     
@@ -84,18 +95,21 @@ def draw_ellipse(img, bbox, fill=None, outline=(255, 0, 0), width=1):
         fill: 填充颜色
         outline: 边框颜色
         width: 边框宽度
+        antialias: 是否抗锯齿（只在图形边界框内超采样）
     
     返回:
         绘制后的Image对象
     """
     print(f"绘制椭圆: {bbox}, 填充: {fill}, 边框: {outline}")
+    if antialias:
+        return Canvas(img, antialias=True).ellipse(bbox, fill=fill, outline=outline, width=width).image
     img_copy = img.copy()
     draw = ImageDraw.Draw(img_copy)
     draw.ellipse(bbox, fill=fill, outline=outline, width=width)
     return img_copy
 
 
-def draw_polygon(img, points, fill=None, outline=(255, 0, 0), width=1):
+def draw_polygon(img, points, fill=None, outline=(255, 0, 0), width=1, antialias=False):
     """
     在图像上绘制多边形
     
@@ -105,11 +119,14 @@ def draw_polygon(img, points, fill=None, outline=(255, 0, 0), width=1):
         fill: 填充颜色
         outline: 边框颜色
         width: 边框宽度
+        antialias: 是否抗锯齿（只在图形边界框内超采样）
     
     返回:
         绘制后的Image对象
     """
     print(f"绘制多边形: {len(points)}个顶点, 填充: {fill}, 边框: {outline}")
+    if antialias:
+        return Canvas(img, antialias=True).polygon(points, fill=fill, outline=outline, width=width).image
     img_copy = img.copy()
     draw = ImageDraw.Draw(img_copy)
     draw.polygon(points, fill=fill, outline=outline)
@@ -264,6 +281,840 @@ def draw_points(img, points, fill=(255, 0, 0)):
     return img_copy
 
 
+@lru_cache(maxsize=32)
+def _load_font(font_size):
+    """按字号加载并缓存字体（系统字体不可用时使用默认字体）"""
+    try:
+        return ImageFont.truetype("Arial.ttf", font_size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+# 各图形参数中表示坐标的键：'point' 为单个点，'points' 为点列表，'box' 为边界框
+_COORD_KEYS = {
+    'line': {'start': 'point', 'end': 'point'},
+    'polyline': {'points': 'points'},
+    'rectangle': {'xy': 'box'},
+    'circle': {'center': 'point'},
+    'ellipse': {'bbox': 'box'},
+    'polygon': {'points': 'points'},
+    'text': {'position': 'point'},
+    'multiline_text': {'position': 'point'},
+    'arc': {'bbox': 'box'},
+    'chord': {'bbox': 'box'},
+    'pieslice': {'bbox': 'box'},
+    'points': {'points': 'points'},
+}
+
+# 支持区域超采样抗锯齿的图形
+_ANTIALIAS_SHAPES = frozenset([
+    'line', 'polyline', 'circle', 'ellipse', 'polygon', 'arc', 'chord', 'pieslice',
+])
+
+# 只有线条颜色（没有填充/边框之分）的图形
+_STROKE_SHAPES = frozenset(['line', 'polyline', 'arc', 'points'])
+
+# 测量文字边界框用的草稿画板
+_MEASURE_DRAW = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def _flatten_coords(value):
+    """把 [x1, y1, x2, y2] 或 [(x1, y1), (x2, y2), ...] 统一成点列表"""
+    value = list(value)
+    if value and isinstance(value[0], (tuple, list)):
+        return [tuple(p) for p in value]
+    return list(zip(value[0::2], value[1::2]))
+
+
+def _map_coords(shape, params, point_func, box_func):
+    """按坐标类型变换图形参数中的所有坐标，返回新的参数字典"""
+    params = dict(params)
+    for key, kind in _COORD_KEYS[shape].items():
+        points = [params[key]] if kind == 'point' else _flatten_coords(params[key])
+        if kind == 'box':
+            (x0, y0), (x1, y1) = points
+            points = list(box_func(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        else:
+            points = [point_func(x, y) for x, y in points]
+        params[key] = points[0] if kind == 'point' else points
+    return params
+
+
+def get_shape_bbox(shape, params):
+    """
+    计算图形覆盖的像素范围（保守估计，包含线宽）
+    
+    参数:
+        shape: 图形名（与 Canvas.draw_batch 的 'shape' 相同）
+        params: 图形参数字典
+    
+    返回:
+        (left, top, right, bottom)，right/bottom 不含
+    """
+    if shape not in _COORD_KEYS:
+        raise ValueError(f"不支持的图形: {shape}")
+    if shape in ('text', 'multiline_text'):
+        font = params.get('font') or _load_font(params.get('font_size', 20))
+        if shape == 'text':
+            box = _MEASURE_DRAW.textbbox(params['position'], params['text'], font=font)
+        else:
+            box = _MEASURE_DRAW.multiline_textbbox(
+                params['position'], params['text'], font=font,
+                spacing=params.get('spacing', 4))
+        points = [box[:2], box[2:]]
+    elif shape == 'circle':
+        (x, y), r = params['center'], params['radius']
+        points = [(x - r, y - r), (x + r, y + r)]
+    else:
+        points = []
+        for key, kind in _COORD_KEYS[shape].items():
+            points.extend([params[key]] if kind == 'point' else _flatten_coords(params[key]))
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    # 线宽向外扩展，再额外留1像素给取整误差
+    margin = math.ceil(params.get('width', 1) / 2) + 1
+    return (math.floor(min(xs)) - margin, math.floor(min(ys)) - margin,
+            math.ceil(max(xs)) + margin + 1, math.ceil(max(ys)) + margin + 1)
+
+
+def translate_shape_params(shape, params, dx, dy, snap=False):
+    """
+    平移图形
+    
+    参数:
+        shape: 图形名
+        params: 图形参数字典
+        dx, dy: 平移量
+        snap: 是否先像 Pillow 一样把坐标向零截断为整数再平移；
+            除文字和圆（坐标参与浮点运算）外，截断后按整数平移的结果
+            与在原位置绘制逐像素一致
+    
+    返回:
+        平移后的图形参数字典
+    """
+    if snap:
+        return _map_coords(shape, params,
+                           lambda x, y: (int(x) + dx, int(y) + dy),
+                           lambda x0, y0, x1, y1: ((int(x0) + dx, int(y0) + dy),
+                                                   (int(x1) + dx, int(y1) + dy)))
+    return _map_coords(shape, params,
+                       lambda x, y: (x + dx, y + dy),
+                       lambda x0, y0, x1, y1: ((x0 + dx, y0 + dy), (x1 + dx, y1 + dy)))
+
+
+class Canvas:
+    """
+    批量绘图画布
+    
+    整个画布只持有一个 ImageDraw 对象，所有图形都直接画在同一张图上：
+    默认只在创建时复制一次原图，in_place=True 时直接在原图上绘制。
+    绘制成千上万个图形时，代价只与图形本身有关，而不是 图像大小 x 图形数量。
+    
+    antialias=True 时，线条、圆、椭圆、多边形和弧形只在各自的边界框内
+    按 supersample 倍超采样绘制覆盖率遮罩，用 reduce() 缩小后与画布混合，
+    代价与图形面积成正比，而不是整幅画布放大 supersample² 倍。
+    
+    用法:
+        canvas = Canvas(img)
+        canvas.circle((100, 100), 50, fill=(255, 0, 0)).line((0, 0), (200, 200))
+        canvas.draw_batch([
+            {'shape': 'rectangle', 'xy': [10, 10, 60, 60], 'outline': (0, 0, 255)},
+            {'shape': 'text', 'position': (20, 80), 'text': 'Hi'},
+        ])
+        result = canvas.image
+    """
+    
+    def __init__(self, img, in_place=False, antialias=False, supersample=4):
+        """
+        参数:
+            img: Image对象
+            in_place: 是否直接在原图上绘制（不复制）
+            antialias: 是否对线条、圆、椭圆、多边形、弧形做抗锯齿
+            supersample: 抗锯齿的超采样倍数
+        """
+        self.image = img if in_place else img.copy()
+        self.draw = ImageDraw.Draw(self.image)
+        self.antialias = antialias
+        self.supersample = supersample
+    
+    def _draw_antialiased(self, shape, params):
+        """在图形边界框内超采样绘制覆盖率遮罩，缩小后按遮罩混合颜色"""
+        width, height = self.image.size
+        left, top, right, bottom = get_shape_bbox(shape, params)
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, width), min(bottom, height)
+        if left >= right or top >= bottom:
+            return
+        
+        s = self.supersample
+        if shape == 'circle':
+            (x, y), r = params.pop('center'), params.pop('radius')
+            shape, params['bbox'] = 'ellipse', [x - r, y - r, x + r, y + r]
+        # 点坐标映射到超采样像素中心；边界框按整像素展开，与不抗锯齿时覆盖相同的像素
+        local = _map_coords(
+            shape, params,
+            lambda x, y: ((x - left) * s + (s - 1) / 2, (y - top) * s + (s - 1) / 2),
+            lambda x0, y0, x1, y1: (((x0 - left) * s, (y0 - top) * s),
+                                    ((x1 - left) * s + s - 1, (y1 - top) * s + s - 1)))
+        if 'width' in local:
+            local['width'] = local['width'] * s
+        
+        # 预乘颜色 P 与覆盖率 T 分别超采样后缩小，再按 底图*(1-T) + P 合成，
+        # 这样填充和边框在同一像素内的部分覆盖也能正确混合
+        size = ((right - left) * s, (bottom - top) * s)
+        colors = Image.new(self.image.mode, size, 0)
+        getattr(Canvas(colors, in_place=True), shape)(**local)
+        box = (left, top, right, bottom)
+        region = self.image.crop(box)
+        if region.mode == 'RGBA':
+            # RGBA 在预乘空间(RGBa)中合成，覆盖率取自预乘结果的 alpha（含颜色自身的透明度）
+            premultiplied = colors.convert('RGBa').reduce(s)
+            coverage = premultiplied.getchannel('a')
+            region = region.convert('RGBa')
+        else:
+            premultiplied = colors.reduce(s)
+            color_keys = [key for key in ('fill', 'outline') if key in local]
+            mask = Image.new('L', size, 0)
+            getattr(Canvas(mask, in_place=True), shape)(
+                **dict(local, **{key: None if local[key] is None else 255 for key in color_keys}))
+            coverage = mask.reduce(s)
+        blank = Image.new(region.mode, region.size, 0)
+        region = ImageChops.add(Image.composite(blank, region, coverage), premultiplied)
+        self.image.paste(region.convert(self.image.mode), box)
+    
+    def _shape(self, shape, **params):
+        """按图形名绘制，需要抗锯齿时走区域超采样"""
+        if (self.antialias and shape in _ANTIALIAS_SHAPES
+                and self.image.mode in ('L', 'RGB', 'RGBA')):
+            self._draw_antialiased(shape, params)
+            return self
+        if shape == 'line':
+            self.draw.line([params['start'], params['end']],
+                           fill=params['fill'], width=params['width'])
+        elif shape == 'polyline':
+            self.draw.line(params['points'], fill=params['fill'], width=params['width'])
+        elif shape == 'circle':
+            x, y = params['center']
+            r = params['radius']
+            self.draw.ellipse([x - r, y - r, x + r, y + r], fill=params['fill'],
+                              outline=params['outline'], width=params['width'])
+        elif shape in ('ellipse', 'chord', 'pieslice', 'arc'):
+            bbox = params.pop('bbox')
+            getattr(self.draw, shape)(bbox, **params)
+        elif shape == 'polygon':
+            self.draw.polygon(params.pop('points'), **params)
+        return self
+    
+    def line(self, start, end, fill=(255, 0, 0), width=1):
+        """绘制线条（参数同 draw_line）"""
+        return self._shape('line', start=start, end=end, fill=fill, width=width)
+    
+    def polyline(self, points, fill=(255, 0, 0), width=1):
+        """一次绘制首尾相连的折线"""
+        return self._shape('polyline', points=points, fill=fill, width=width)
+    
+    def rectangle(self, xy, fill=None, outline=(255, 0, 0), width=1):
+        """绘制矩形（参数同 draw_rectangle）"""
+        self.draw.rectangle(xy, fill=fill, outline=outline, width=width)
+        return self
+    
+    def circle(self, center, radius, fill=None, outline=(255, 0, 0), width=1):
+        """绘制圆形（参数同 draw_circle）"""
+        return self._shape('circle', center=center, radius=radius,
+                           fill=fill, outline=outline, width=width)
+    
+    def ellipse(self, bbox, fill=None, outline=(255, 0, 0), width=1):
+        """绘制椭圆（参数同 draw_ellipse）"""
+        return self._shape('ellipse', bbox=bbox, fill=fill, outline=outline, width=width)
+    
+    def polygon(self, points, fill=None, outline=(255, 0, 0), width=1):
+        """绘制多边形（参数同 draw_polygon）"""
+        return self._shape('polygon', points=points, fill=fill, outline=outline, width=width)
+    
+    def text(self, position, text, fill=(0, 0, 0), font=None, font_size=20):
+        """绘制文字（参数同 draw_text，字体按字号缓存）"""
+        if font is None:
+            font = _load_font(font_size)
+        self.draw.text(position, text, fill=fill, font=font)
+        return self
+    
+    def multiline_text(self, position, text, fill=(0, 0, 0), font=None, font_size=20, spacing=4):
+        """绘制多行文字（参数同 draw_multiline_text）"""
+        if font is None:
+            font = _load_font(font_size)
+        self.draw.multiline_text(position, text, fill=fill, font=font, spacing=spacing)
+        return self
+    
+    def arc(self, bbox, start, end, fill=(255, 0, 0), width=1):
+        """绘制弧线（参数同 draw_arc）"""
+        return self._shape('arc', bbox=bbox, start=start, end=end, fill=fill, width=width)
+    
+    def chord(self, bbox, start, end, fill=None, outline=(255, 0, 0), width=1):
+        """绘制弦（参数同 draw_chord）"""
+        return self._shape('chord', bbox=bbox, start=start, end=end,
+                           fill=fill, outline=outline, width=width)
+    
+    def pieslice(self, bbox, start, end, fill=None, outline=(255, 0, 0), width=1):
+        """绘制扇形（参数同 draw_pieslice）"""
+        return self._shape('pieslice', bbox=bbox, start=start, end=end,
+                           fill=fill, outline=outline, width=width)
+    
+    def points(self, points, fill=(255, 0, 0)):
+        """绘制点（参数同 draw_points）"""
+        self.draw.point(points, fill=fill)
+        return self
+    
+    def draw_batch(self, commands):
+        """
+        一次绘制一批图形
+        
+        参数:
+            commands: 命令列表，每条命令是一个字典，'shape' 为图形名
+                (line, polyline, rectangle, circle, ellipse, polygon, text,
+                multiline_text, arc, chord, pieslice, points)，其余键为该图形的参数
+        
+        返回:
+            画布自身（可继续链式调用）
+        """
+        print(f"批量绘制 {len(commands)} 个图形")
+        for command in commands:
+            params = dict(command)
+            shape = params.pop('shape')
+            if shape not in _COORD_KEYS:
+                raise ValueError(f"不支持的图形: {shape}")
+            getattr(self, shape)(**params)
+        return self
+
+
+def draw_shapes(img, commands, in_place=False):
+    """
+    在图像上批量绘制图形（只复制一次，或者不复制）
+    
+    参数:
+        img: Image对象
+        commands: 图形命令列表（格式见 Canvas.draw_batch）
+        in_place: 是否直接在原图上绘制
+    
+    返回:
+        绘制后的Image对象
+    """
+    return Canvas(img, in_place=in_place).draw_batch(commands).image
+
+
+# 颜色映射表的锚点颜色（均匀分布在 0-1 上，中间线性插值为 256 级）
+_COLORMAP_ANCHORS = {
+    'viridis': [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)],
+    'hot': [(0, 0, 0), (230, 0, 0), (255, 210, 0), (255, 255, 255)],
+    'gray': [(0, 0, 0), (255, 255, 255)],
+    'blue_red': [(0, 0, 255), (255, 255, 255), (255, 0, 0)],
+}
+
+
+@lru_cache(maxsize=16)
+def _colormap_lut(colormap):
+    """把锚点颜色插值成 256x3 的 uint8 查找表"""
+    anchors = _COLORMAP_ANCHORS[colormap] if isinstance(colormap, str) else colormap
+    anchors = np.asarray(anchors, dtype=np.float64)
+    positions = np.linspace(0.0, 1.0, len(anchors))
+    levels = np.linspace(0.0, 1.0, 256)
+    lut = np.stack([np.interp(levels, positions, anchors[:, c]) for c in range(3)], axis=1)
+    return np.rint(lut).astype(np.uint8)
+
+
+def _colors_for_mode(rgb, mode):
+    """把 Nx3 的RGB颜色数组转换成目标图像模式的像素值"""
+    if mode == 'L':
+        return (rgb[:, 0] * 299 + rgb[:, 1] * 587 + rgb[:, 2] * 114 + 500) // 1000
+    if mode == 'RGBA':
+        return np.concatenate([rgb, np.full((len(rgb), 1), 255, dtype=rgb.dtype)], axis=1)
+    return rgb
+
+
+def _fill_for_mode(fill, mode):
+    """
+    把单个颜色（灰度值、RGB 或 RGBA）转换成目标图像模式的像素值
+    
+    L 画布取亮度；RGBA 画布上未给出透明度的颜色按不透明处理
+    """
+    color = np.atleast_1d(np.asarray(fill, dtype=np.int32))
+    if color.size == 1:
+        color = np.repeat(color, 3)
+    if mode == 'RGBA' and color.size == 4:
+        return color
+    return _colors_for_mode(color[np.newaxis, :3], mode)[0]
+
+
+def _normalize_values(values, vmin, vmax):
+    """把数值线性映射到 0-255 的查找表索引"""
+    values = np.asarray(values, dtype=np.float64)
+    vmin = values.min() if vmin is None else vmin
+    vmax = values.max() if vmax is None else vmax
+    scale = 255.0 / (vmax - vmin) if vmax > vmin else 0.0
+    return np.clip((values - vmin) * scale, 0, 255).astype(np.intp)
+
+
+def draw_scatter(img, x, y, fill=(255, 0, 0), colors=None, values=None, mode='points',
+                 colormap='viridis', vmin=None, vmax=None, log_scale=True, in_place=False):
+    """
+    用NumPy向量化绘制大量散点（适合数百万到数千万个点）
+    
+    参数:
+        img: Image对象 (L/RGB/RGBA)
+        x, y: 点坐标数组（可以是浮点数，四舍五入到像素；画布外的点被丢弃）
+        fill: 统一的点颜色（未提供 colors/values 时使用，按画布模式转换：L 取亮度，RGBA 补不透明）
+        colors: 每个点的颜色，Nx3 或 Nx4 的数组
+        values: 每个点的数值：points 模式下按 colormap 着色，
+            density/additive 模式下作为累加权重
+        mode: 绘制方式
+            'points': 直接按索引赋值，重叠时后面的点覆盖前面的点
+            'density': 用 bincount 统计每个像素的点数，经 colormap 着色后覆盖有点的像素
+            'additive': 每个点把 fill 颜色按权重叠加到像素上（加色混合，截断到255）
+        colormap: 颜色映射名 ('viridis', 'hot', 'gray', 'blue_red') 或锚点颜色列表（如 [(0, 0, 0), (255, 0, 0)]）
+        vmin, vmax: values 或密度的映射范围，默认取实际最小/最大值
+        log_scale: density 模式下是否对计数取对数后再着色
+        in_place: 是否直接修改原图
+    
+    返回:
+        绘制后的Image对象
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    print(f"绘制散点: {x.size} 个点, 方式 {mode}")
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        raise ValueError(f"散点绘制只支持 L/RGB/RGBA 模式，当前为 {img.mode}")
+    if not isinstance(colormap, str):
+        # 查找表按 colormap 缓存，锚点颜色列表需要转换成可哈希的元组
+        colormap = tuple(map(tuple, colormap))
+    width, height = img.size
+    xi = np.rint(x).astype(np.intp)
+    yi = np.rint(y).astype(np.intp)
+    inside = (xi >= 0) & (xi < width) & (yi >= 0) & (yi < height)
+    if not inside.all():
+        xi, yi = xi[inside], yi[inside]
+        colors = None if colors is None else np.asarray(colors)[inside]
+        values = None if values is None else np.asarray(values)[inside]
+    
+    pixels = np.array(img)
+    if mode == 'points':
+        if colors is not None:
+            point_colors = np.asarray(colors, dtype=np.uint8)
+            if img.mode == 'L':
+                point_colors = _colors_for_mode(point_colors[:, :3].astype(np.int32), 'L')
+            elif point_colors.shape[1] != pixels.shape[2]:
+                point_colors = _colors_for_mode(point_colors[:, :3], img.mode)
+        elif values is not None:
+            lut = _colors_for_mode(_colormap_lut(colormap).astype(np.int32), img.mode)
+            point_colors = lut[_normalize_values(values, vmin, vmax)]
+        else:
+            point_colors = _fill_for_mode(fill, img.mode)
+        pixels[yi, xi] = point_colors
+    elif mode in ('density', 'additive'):
+        counts = np.bincount(yi * width + xi, weights=values,
+                             minlength=width * height).reshape(height, width)
+        if mode == 'density':
+            hit = counts > 0
+            levels = np.log1p(counts[hit]) if log_scale else counts[hit]
+            lut = _colors_for_mode(_colormap_lut(colormap).astype(np.int32), img.mode)
+            pixels[hit] = lut[_normalize_values(levels, vmin, vmax)]
+        else:
+            color = _fill_for_mode(fill, img.mode).astype(np.float64)
+            added = pixels.astype(np.float64)
+            if added.ndim == 2:
+                added += counts * color
+            else:
+                added += counts[:, :, np.newaxis] * color
+            pixels = np.clip(added, 0, 255).astype(np.uint8)
+    else:
+        raise ValueError(f"不支持的绘制方式: {mode}")
+    
+    result = Image.fromarray(pixels, img.mode)
+    if in_place:
+        img.paste(result)
+        return img
+    return result
+
+
+# 多条序列的默认颜色
+_SERIES_COLORS = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40),
+                  (148, 103, 189), (140, 86, 75), (227, 119, 194), (127, 127, 127)]
+
+
+def _m4_reduce(bucket, y):
+    """
+    M4 降采样：每个桶只保留 首点、最小值点、最大值点、末点（按时间顺序）
+    
+    bucket 必须单调不减（样本按时间排序），返回 (桶编号, Gx4 的样本下标)
+    """
+    n = len(bucket)
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    
+    def first_match(values):
+        # 每个桶中第一个等于桶内极值的样本下标
+        hits = np.flatnonzero(y == values[group])
+        keep = np.r_[True, group[hits][1:] != group[hits][:-1]]
+        return hits[keep]
+    
+    i_min = first_match(np.minimum.reduceat(y, starts))
+    i_max = first_match(np.maximum.reduceat(y, starts))
+    index = np.stack([starts, np.minimum(i_min, i_max), np.maximum(i_min, i_max), ends], axis=1)
+    return bucket[starts], index
+
+
+def decimate_series(x, y, width, x_range=None):
+    """
+    按像素列对时间序列做 M4 降采样（最小/最大包络）
+    
+    参数:
+        x, y: 按 x 升序排列的样本数组（NaN 样本被丢弃）
+        width: 像素列数
+        x_range: (x_min, x_max)，默认取 x 的范围；范围外的样本被丢弃
+    
+    返回:
+        (xs, ys) 降采样后的样本，每列最多 4 个，
+        逐段连接后与原序列在该宽度下绘制出的折线覆盖相同的像素列范围
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    if x_range is not None:
+        keep &= (x >= x_range[0]) & (x <= x_range[1])
+    if not keep.all():
+        x, y = x[keep], y[keep]
+    if x.size == 0:
+        return x, y
+    x_min, x_max = x_range if x_range is not None else (x[0], x[-1])
+    # 桶与绘制时的像素列对齐（ImageDraw 对浮点坐标向下取整）
+    scale = (width - 1) / ((x_max - x_min) or 1.0)
+    bucket = np.floor((x - x_min) * scale).astype(np.int64)
+    _, index = _m4_reduce(bucket, y)
+    index = index.ravel()
+    return x[index], y[index]
+
+
+def _series_polyline(xs, ys, x_range, y_range, size):
+    """把数据坐标映射为像素坐标的扁平列表（y 轴向上）"""
+    width, height = size
+    x_scale = (width - 1) / ((x_range[1] - x_range[0]) or 1.0)
+    y_scale = (height - 1) / ((y_range[1] - y_range[0]) or 1.0)
+    px = (xs - x_range[0]) * x_scale
+    py = (y_range[1] - ys) * y_scale
+    return np.stack([px, py], axis=1).ravel().tolist()
+
+
+def _data_range(arrays):
+    """多组数组合并后的 (最小值, 最大值)，忽略 NaN"""
+    lows = [np.nanmin(a) for a in arrays if a.size]
+    highs = [np.nanmax(a) for a in arrays if a.size]
+    if not lows:
+        return (0.0, 1.0)
+    return (float(min(lows)), float(max(highs)))
+
+
+def draw_time_series(img, series, x_range=None, y_range=None, colors=None, width=1, in_place=False):
+    """
+    绘制大规模时间序列折线图（先按像素列做 M4 降采样，每条序列只调用一次 ImageDraw.line）
+    
+    参数:
+        img: Image对象
+        series: 序列列表，每项为 y 数组或 (x, y) 元组（x 须升序）
+        x_range: 横轴范围 (x_min, x_max)，默认取所有序列的范围
+        y_range: 纵轴范围 (y_min, y_max)，默认取所有序列的范围
+        colors: 每条序列的颜色列表，默认使用内置配色
+        width: 线宽
+        in_place: 是否直接修改原图
+    
+    返回:
+        绘制后的Image对象
+    """
+    pairs = []
+    for item in series:
+        if isinstance(item, tuple):
+            x, y = item
+        else:
+            y = item
+            x = np.arange(len(y))
+        pairs.append((np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)))
+    total = sum(y.size for _, y in pairs)
+    print(f"绘制时间序列: {len(pairs)} 条, 共 {total} 个样本")
+    
+    if x_range is None:
+        x_range = _data_range([x for x, _ in pairs])
+    if y_range is None:
+        y_range = _data_range([y for _, y in pairs])
+    colors = colors or _SERIES_COLORS
+    
+    canvas = Canvas(img, in_place=in_place)
+    for i, (x, y) in enumerate(pairs):
+        xs, ys = decimate_series(x, y, img.width, x_range)
+        if xs.size:
+            canvas.draw.line(_series_polyline(xs, ys, x_range, y_range, img.size),
+                             fill=colors[i % len(colors)], width=width,
+                             joint='curve' if width > 2 else None)
+    return canvas.image
+
+
+class TimeSeriesChart:
+    """
+    实时折线图（流式追加样本）
+    
+    每条序列只保存最近 window 时间范围内各像素列的 M4 降采样结果
+    （每列最多 4 个样本），追加和渲染的代价都与图像宽度成正比，
+    与累计的样本总数无关。
+    
+    用法:
+        chart = TimeSeriesChart(800, 300, window=60.0)
+        chart.append('cpu', timestamps, values)
+        frame = chart.render()
+    """
+    
+    def __init__(self, width, height, window, y_range=None, background=(255, 255, 255),
+                 colors=None, line_width=1):
+        """
+        参数:
+            width, height: 图表尺寸
+            window: 显示的时间窗口长度（与 x 同单位），最新样本位于右边缘
+            y_range: 纵轴范围，默认按窗口内数据自动调整
+            background: 背景颜色
+            colors: 序列颜色列表
+            line_width: 线宽
+        """
+        self.size = (width, height)
+        self.window = float(window)
+        self.y_range = y_range
+        self.background = background
+        self.colors = colors or _SERIES_COLORS
+        self.line_width = line_width
+        self._bucket_width = self.window / (width - 1)
+        self._series = {}
+    
+    def append(self, name, x, y):
+        """
+        追加样本
+        
+        参数:
+            name: 序列名（首次出现时自动创建）
+            x, y: 新样本数组，x 须升序且不早于该序列已有的样本
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        keep = np.isfinite(x) & np.isfinite(y)
+        x, y = x[keep], y[keep]
+        if x.size == 0:
+            return
+        old_buckets, old_x, old_y = self._series.get(
+            name, (np.empty(0, np.int64), np.empty(0), np.empty(0)))
+        
+        # 已有的最后一个桶可能与新样本同桶：带上它重新做一次 M4
+        bucket = np.floor(x / self._bucket_width).astype(np.int64)
+        tail = 4 if old_buckets.size and old_buckets[-1] == bucket[0] else 0
+        if tail:
+            x = np.r_[old_x[-tail:], x]
+            y = np.r_[old_y[-tail:], y]
+            bucket = np.r_[np.full(tail, bucket[0]), bucket]
+        buckets, index = _m4_reduce(bucket, y)
+        index = index.ravel()
+        
+        buckets = np.r_[old_buckets[:old_buckets.size - tail // 4], buckets]
+        xs = np.r_[old_x[:old_x.size - tail], x[index]]
+        ys = np.r_[old_y[:old_y.size - tail], y[index]]
+        
+        # 丢弃移出时间窗口的桶（多保留一个桶，让折线从左边缘外连进来）
+        first = np.searchsorted(buckets, buckets[-1] - self.size[0] - 1)
+        self._series[name] = (buckets[first:], xs[first * 4:], ys[first * 4:])
+    
+    @property
+    def latest(self):
+        """所有序列中最新样本的 x"""
+        ends = [xs[-1] for _, xs, _ in self._series.values() if xs.size]
+        return max(ends) if ends else 0.0
+    
+    def x_range(self):
+        """当前显示的横轴范围，右边缘对齐到最新样本所在桶的起点，保证桶与像素列一一对应"""
+        right = np.floor(self.latest / self._bucket_width) * self._bucket_width
+        return (right - self._bucket_width * (self.size[0] - 1), right)
+    
+    def render(self):
+        """
+        渲染当前时间窗口
+        
+        返回:
+            新的图表图像
+        """
+        img = Image.new('RGB', self.size, self.background)
+        if not self._series:
+            return img
+        x_range = self.x_range()
+        y_range = self.y_range or _data_range([ys for _, _, ys in self._series.values()])
+        draw = ImageDraw.Draw(img)
+        for i, (_, xs, ys) in enumerate(self._series.values()):
+            if xs.size:
+                draw.line(_series_polyline(xs, ys, x_range, y_range, self.size),
+                          fill=self.colors[i % len(self.colors)], width=self.line_width,
+                          joint='curve' if self.line_width > 2 else None)
+        return img
+
+
+def _render_marker(shape, size, color, antialias):
+    """把标记绘制到透明的 RGBA 小图上，返回 (小图, 锚点)"""
+    s = size
+    last = s - 1
+    mid = last / 2
+    stroke = max(1, s // 6)
+    height = s + s // 2 if shape == 'pin' else s
+    tile = Image.new('RGBA', (s, height), (0, 0, 0, 0))
+    canvas = Canvas(tile, in_place=True, antialias=antialias)
+    if shape == 'circle':
+        canvas.ellipse([0, 0, last, last], fill=color, outline=None)
+    elif shape == 'ring':
+        canvas.ellipse([0, 0, last, last], fill=None, outline=color, width=stroke)
+    elif shape == 'square':
+        canvas.rectangle([0, 0, last, last], fill=color, outline=None)
+    elif shape == 'triangle':
+        canvas.polygon([(mid, 0), (last, last), (0, last)], fill=color, outline=None)
+    elif shape == 'diamond':
+        canvas.polygon([(mid, 0), (last, mid), (mid, last), (0, mid)], fill=color, outline=None)
+    elif shape == 'cross':
+        canvas.line((0, mid), (last, mid), fill=color, width=stroke)
+        canvas.line((mid, 0), (mid, last), fill=color, width=stroke)
+    elif shape == 'x':
+        canvas.line((0, 0), (last, last), fill=color, width=stroke)
+        canvas.line((0, last), (last, 0), fill=color, width=stroke)
+    elif shape == 'pin':
+        # 圆头加向下的尖角，锚点在尖端
+        canvas.polygon([(s * 0.15, mid + s * 0.2), (last - s * 0.15, mid + s * 0.2), (mid, height - 1)],
+                       fill=color, outline=None)
+        canvas.ellipse([0, 0, last, last], fill=color, outline=None)
+        return tile, (s // 2, height - 1)
+    else:
+        raise ValueError(f"不支持的标记形状: {shape}")
+    return tile, (s // 2, s // 2)
+
+
+class SpriteCache:
+    """
+    标记精灵缓存
+    
+    每种 (形状, 尺寸, 颜色, 抗锯齿, 目标模式) 组合只光栅化一次，
+    按目标图像模式预先拆好 颜色图 + 遮罩，之后每次盖章只需一次 paste / alpha_composite。
+    缓存按最近最少使用淘汰，总占用不超过 max_bytes。
+    
+    属性:
+        hits, misses, evictions: 命中、未命中、淘汰次数
+    """
+    
+    def __init__(self, max_bytes=64 * 2 ** 20):
+        """
+        参数:
+            max_bytes: 缓存的字节预算
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+    
+    def get(self, shape, size, color, antialias=False, mode='RGBA'):
+        """
+        获取标记精灵
+        
+        参数:
+            shape: 'circle', 'ring', 'square', 'triangle', 'diamond', 'cross', 'x', 'pin'
+            size: 标记尺寸（像素）
+            color: 标记颜色
+            antialias: 是否抗锯齿
+            mode: 目标图像模式
+        
+        返回:
+            (精灵图, 遮罩或None, 锚点)；RGBA 目标的精灵直接用于 alpha_composite，不需要遮罩
+        """
+        color = tuple(color) if isinstance(color, (list, tuple)) else color
+        key = (shape, size, color, antialias, mode)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+        
+        self.misses += 1
+        # 灰度值按不透明的灰色绘制到 RGBA 精灵上
+        rgba = (color, color, color, 255) if isinstance(color, int) else color
+        tile, anchor = _render_marker(shape, size, rgba, antialias)
+        if mode == 'RGBA':
+            sprite = (tile, None, anchor)
+        else:
+            sprite = (tile.convert(mode), tile.getchannel('A'), anchor)
+        nbytes = sum(len(im.getbands()) * im.width * im.height for im in sprite[:2] if im is not None)
+        self._entries[key] = (sprite, nbytes)
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted
+            self.evictions += 1
+        return sprite
+    
+    def stats(self):
+        """返回缓存统计信息字典"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+        }
+    
+    def clear(self):
+        """清空缓存（计数器保留）"""
+        self._entries.clear()
+        self.current_bytes = 0
+
+
+# 模块级默认标记缓存，draw_markers 未指定 cache 时使用
+marker_cache = SpriteCache()
+
+
+def draw_markers(img, positions, shape='circle', size=9, color=(255, 0, 0), antialias=False,
+                 in_place=False, cache=None):
+    """
+    批量盖章绘制相同的标记（精灵只光栅化一次并缓存）
+    
+    参数:
+        img: Image对象
+        positions: 标记锚点位置列表 [(x, y), ...] 或 Nx2 数组
+        shape: 标记形状 ('circle', 'ring', 'square', 'triangle', 'diamond', 'cross', 'x', 'pin')
+        size: 标记尺寸（像素）
+        color: 标记颜色（RGBA 图像可带透明度）
+        antialias: 是否抗锯齿
+        in_place: 是否直接修改原图
+        cache: SpriteCache 对象，默认使用模块级的 marker_cache
+    
+    返回:
+        绘制后的Image对象
+    """
+    positions = np.rint(np.asarray(positions, dtype=np.float64).reshape(-1, 2)).astype(int)
+    print(f"绘制 {len(positions)} 个标记: {shape}, 尺寸 {size}")
+    cache = marker_cache if cache is None else cache
+    result = img if in_place else img.copy()
+    sprite, mask, (ax, ay) = cache.get(shape, size, color, antialias, result.mode)
+    
+    width, height = result.size
+    sw, sh = sprite.size
+    for x, y in positions.tolist():
+        left, top = x - ax, y - ay
+        if mask is not None:
+            # paste 会自动裁掉画布外的部分
+            result.paste(sprite, (left, top), mask)
+            continue
+        # alpha_composite 的目标位置不能为负，先裁掉精灵超出画布的部分
+        x0, y0 = max(-left, 0), max(-top, 0)
+        x1, y1 = min(sw, width - left), min(sh, height - top)
+        if x0 < x1 and y0 < y1:
+            result.alpha_composite(sprite, (left + x0, top + y0), (x0, y0, x1, y1))
+    return result
+
+
 # 示例使用
 if __name__ == "__main__":
     print("=== Pillow 绘图功能示例 ===\n")
@@ -331,5 +1182,55 @@ if __name__ == "__main__":
                             fill=(0, 0, 0), font_size=25)
     save_image(img_combined, "output/36_combined_drawing.png")
     
+    # 10. 批量绘图（只复制一次画布）
+    img_batch = draw_shapes(canvas, [
+        {'shape': 'rectangle', 'xy': [50, 50, 550, 350], 'outline': (0, 0, 0), 'width': 2},
+        {'shape': 'circle', 'center': (150, 150), 'radius': 50,
+         'fill': (255, 100, 100), 'outline': (200, 0, 0), 'width': 2},
+        {'shape': 'circle', 'center': (450, 150), 'radius': 50,
+         'fill': (100, 255, 100), 'outline': (0, 200, 0), 'width': 2},
+        {'shape': 'text', 'position': (220, 320), 'text': "Batch Drawing", 'font_size': 25},
+    ])
+    save_image(img_batch, "output/36a_batch_drawing.png")
+    
+    # 11. 抗锯齿（只在图形所在区域超采样）
+    img_aa = draw_circle(canvas, (300, 200), 120, fill=(255, 200, 200),
+                         outline=(255, 0, 0), width=3, antialias=True)
+    img_aa = draw_line(img_aa, (50, 380), (550, 20), fill=(0, 0, 255), width=2, antialias=True)
+    save_image(img_aa, "output/36b_antialiased.png")
+    
+    # 12. 大量散点（向量化绘制，密度着色）
+    rng = np.random.default_rng(0)
+    xs = rng.normal(300, 80, 200000)
+    ys = rng.normal(200, 50, 200000)
+    img_scatter = draw_scatter(create_new_image(600, 400, (0, 0, 0)), xs, ys,
+                               mode='density', colormap='hot')
+    save_image(img_scatter, "output/36c_scatter_density.png")
+    
+    # 自定义锚点颜色列表、默认颜色和加色叠加在 L/RGBA 画布上同样可用
+    for scatter_mode in ('L', 'RGBA'):
+        scatter_canvas = Image.new(scatter_mode, (600, 400))
+        draw_scatter(scatter_canvas, xs, ys, values=xs, colormap=[(0, 0, 0), (255, 0, 0)],
+                     in_place=True)
+        draw_scatter(scatter_canvas, xs[:1000], ys[:1000], in_place=True)
+        draw_scatter(scatter_canvas, xs, ys, fill=(0, 40, 80), mode='additive', in_place=True)
+        save_image(scatter_canvas, f"output/36c_scatter_{scatter_mode}.png")
+    
+    # 13. 大规模时间序列（每列 M4 降采样后一次性绘制）
+    t = np.linspace(0, 100, 1000000)
+    signal = np.sin(t) + rng.normal(0, 0.3, t.size)
+    img_series = draw_time_series(create_new_image(800, 300, (255, 255, 255)),
+                                  [(t, signal), (t, np.cos(t / 3) * 2)], width=1)
+    save_image(img_series, "output/36d_time_series.png")
+    
+    # 14. 标记精灵缓存（相同标记只光栅化一次）
+    img_markers = create_new_image(600, 400, (240, 240, 240))
+    marker_positions = rng.uniform(0, [600, 400], size=(2000, 2))
+    img_markers = draw_markers(img_markers, marker_positions[:1000], 'circle', 7, (52, 152, 219), antialias=True)
+    img_markers = draw_markers(img_markers, marker_positions[1000:], 'cross', 9, (231, 76, 60))
+    img_markers = draw_markers(img_markers, [(300, 200)], 'pin', 24, (46, 204, 113), antialias=True)
+    print(f"标记缓存: {marker_cache.stats()}")
+    save_image(img_markers, "output/36e_markers.png")
+    
     print("\n所有绘图示例已完成！请查看 output/ 目录")
 
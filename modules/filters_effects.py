@@ -4,6 +4,7 @@
 """
 
 from PIL import Image, ImageFilter, ImageEnhance
+import numpy as np
 
 
 def apply_blur(img, radius=2):
@@ -274,6 +275,471 @@ def apply_unsharp_mask(img, radius=2, percent=150, threshold=3):
     return img.filter(ImageFilter.UnsharpMask(radius, percent, threshold))
 
 
+# 卷积引擎的代价模型：FFT每像素的代价约等于 系数 x log2(补边后像素数) 次逐项累加
+_FFT_COST_FACTOR = 2.0
+# 判断核是否为秩1（可分离）时，第二奇异值相对第一奇异值的容差
+_SEPARABLE_TOLERANCE = 1e-6
+
+_BORDER_MODES = {
+    'reflect': 'symmetric',
+    'mirror': 'reflect',
+    'edge': 'edge',
+    'wrap': 'wrap',
+    'constant': 'constant',
+}
+
+
+def _next_fast_len(n):
+    """返回不小于n、且只含因子2/3/5的整数（FFT在这些长度上最快）"""
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p = p35
+            while p < n:
+                p *= 2
+            best = min(best, p)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def _split_separable(kernel):
+    """
+    通过SVD检测核是否为秩1（可分离）
+    
+    返回:
+        (列向量, 行向量)，不可分离时返回 None
+    """
+    if kernel.shape[1] == 1:
+        return kernel[:, 0], np.ones(1)
+    if kernel.shape[0] == 1:
+        return np.ones(1), kernel[0]
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or s[1] > _SEPARABLE_TOLERANCE * s[0]:
+        return None
+    scale = np.sqrt(s[0])
+    return u[:, 0] * scale, vt[0] * scale
+
+
+def _choose_convolution_method(kernel, shape):
+    """根据核大小、稀疏度和可分离性估算代价，选择卷积方式"""
+    kh, kw = kernel.shape
+    nnz = int(np.count_nonzero(kernel))
+    costs = {'direct': nnz}
+    if _split_separable(kernel) is not None:
+        costs['separable'] = kh + kw
+    padded = (shape[0] + kh - 1) * (shape[1] + kw - 1)
+    costs['fft'] = _FFT_COST_FACTOR * np.log2(max(padded, 2))
+    return min(costs, key=costs.get)
+
+
+def _pad_for_kernel(band, kh, kw, border):
+    """按核的锚点（中心）为单个通道补边，使卷积后尺寸不变"""
+    cy, cx = kh // 2, kw // 2
+    pad = ((kh - 1 - cy, cy), (kw - 1 - cx, cx))
+    return np.pad(band, pad, mode=_BORDER_MODES[border])
+
+
+def _correlate_valid(padded, flipped):
+    """对补边后的通道做逐项平移累加，跳过零系数"""
+    kh, kw = flipped.shape
+    height = padded.shape[0] - kh + 1
+    width = padded.shape[1] - kw + 1
+    acc = np.zeros((height, width), dtype=np.float32)
+    for i, j in zip(*np.nonzero(flipped)):
+        acc += np.float32(flipped[i, j]) * padded[i:i + height, j:j + width]
+    return acc
+
+
+def _convolve_band(band, kernel, method, border, kernel_fft=None):
+    """对单个二维通道做卷积，输出与输入同尺寸的float64数组"""
+    kh, kw = kernel.shape
+    padded = _pad_for_kernel(band, kh, kw, border)
+    if method == 'direct':
+        return _correlate_valid(padded, kernel[::-1, ::-1])
+    if method == 'separable':
+        col, row = _split_separable(kernel)
+        tmp = _correlate_valid(padded, col[::-1].reshape(-1, 1))
+        return _correlate_valid(tmp, row[::-1].reshape(1, -1))
+    # FFT：补边后的线性卷积中，[kh-1, kh-1+H) 区间不受循环卷积回绕影响
+    fft_shape, spectrum = kernel_fft
+    full = np.fft.irfft2(np.fft.rfft2(padded, fft_shape) * spectrum, fft_shape)
+    height, width = band.shape
+    return full[kh - 1:kh - 1 + height, kw - 1:kw - 1 + width]
+
+
+def apply_convolution(img, kernel, normalize=True, offset=0, border='reflect',
+                      method='auto'):
+    """
+    应用任意尺寸的二维卷积核（不受 ImageFilter.Kernel 3x3/5x5 的限制）
+    
+    参数:
+        img: Image对象 (L/RGB/RGBA，其它模式会先转换为RGB)
+        kernel: 二维卷积核（嵌套列表或NumPy数组），锚点为核中心，
+            系数排列与 ImageFilter.Kernel 一致
+        normalize: 是否按核元素之和归一化（和为0时不归一化）
+        offset: 卷积结果的偏移量
+        border: 边界处理方式 ('reflect', 'mirror', 'edge', 'wrap', 'constant')
+        method: 计算方式 ('auto', 'direct', 'separable', 'fft')
+            auto 会根据核的稀疏度、可分离性(SVD秩1检测)和尺寸自动选择
+    
+    返回:
+        卷积后的Image对象
+    """
+    kernel = np.asarray(kernel, dtype=np.float64)
+    if kernel.ndim != 2 or kernel.size == 0:
+        raise ValueError("卷积核必须是非空的二维数组")
+    if border not in _BORDER_MODES:
+        raise ValueError(f"不支持的边界处理方式: {border}")
+    if normalize:
+        total = kernel.sum()
+        if total != 0:
+            kernel = kernel / total
+    # ImageFilter.Kernel 的系数在水平方向按相关运算排列（左列对应左侧像素），
+    # 垂直方向按卷积排列（首行对应下方像素），只需左右翻转即可按卷积计算
+    kernel = kernel[:, ::-1]
+    
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if method == 'auto':
+        method = _choose_convolution_method(kernel, (img.height, img.width))
+    elif method == 'separable' and _split_separable(kernel) is None:
+        raise ValueError("卷积核不可分离（秩大于1）")
+    elif method not in ('direct', 'separable', 'fft'):
+        raise ValueError(f"不支持的计算方式: {method}")
+    print(f"应用卷积: 核 {kernel.shape[0]}x{kernel.shape[1]}, 方式 {method}, 边界 {border}")
+    
+    kernel_fft = None
+    if method == 'fft':
+        kh, kw = kernel.shape
+        fft_shape = (_next_fast_len(img.height + kh - 1),
+                     _next_fast_len(img.width + kw - 1))
+        kernel_fft = (fft_shape, np.fft.rfft2(kernel, fft_shape))
+    
+    # 逐项累加用float32即可满足8位精度，FFT保持float64
+    data = np.asarray(img, dtype=np.float64 if method == 'fft' else np.float32)
+    if img.mode == 'L':
+        data = data[:, :, np.newaxis]
+    alpha = None
+    if img.mode == 'RGBA':
+        # 预乘Alpha后再卷积，避免透明像素的颜色渗入边缘
+        alpha = data[:, :, 3:] / 255.0
+        data = data[:, :, :3] * alpha
+    
+    bands = [_convolve_band(data[:, :, c], kernel, method, border, kernel_fft)
+             for c in range(data.shape[2])]
+    result = np.stack(bands, axis=2)
+    
+    if alpha is not None:
+        new_alpha = _convolve_band(alpha[:, :, 0], kernel, method, border, kernel_fft)
+        new_alpha = np.clip(new_alpha, 0.0, 1.0)[:, :, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.where(new_alpha > 0, result / new_alpha, 0.0)
+    
+    # offset 只作用于颜色通道，透明度保持卷积结果
+    result = np.clip(np.rint(result + offset), 0, 255)
+    if alpha is not None:
+        result = np.concatenate([result, np.clip(np.rint(new_alpha * 255.0), 0, 255)], axis=2)
+    result = result.astype(np.uint8)
+    if img.mode == 'L':
+        result = result[:, :, 0]
+    return Image.fromarray(result, img.mode)
+
+
+def create_motion_kernel(length, angle=0):
+    """
+    创建运动模糊卷积核
+    
+    参数:
+        length: 运动轨迹长度（像素）
+        angle: 运动方向角度（度，0为水平向右，逆时针为正）
+    
+    返回:
+        length x length 的NumPy卷积核
+    """
+    size = max(1, int(length)) | 1
+    kernel = np.zeros((size, size), dtype=np.float64)
+    center = size // 2
+    theta = np.deg2rad(angle)
+    steps = np.linspace(-center, center, size * 4)
+    xs = np.rint(center + steps * np.cos(theta)).astype(int)
+    # 首行系数对应下方像素（与 ImageFilter.Kernel 相同），向上的分量放在下方的行
+    ys = np.rint(center + steps * np.sin(theta)).astype(int)
+    kernel[ys, xs] = 1.0
+    return kernel / kernel.sum()
+
+
+def create_disk_kernel(radius):
+    """
+    创建圆盘卷积核（模拟镜头散焦/景深模糊）
+    
+    参数:
+        radius: 圆盘半径（像素）
+    
+    返回:
+        (2*radius+1) x (2*radius+1) 的NumPy卷积核
+    """
+    r = int(np.ceil(radius))
+    ys, xs = np.mgrid[-r:r + 1, -r:r + 1]
+    kernel = (xs ** 2 + ys ** 2 <= radius ** 2).astype(np.float64)
+    return kernel / kernel.sum()
+
+
+def apply_motion_blur(img, length=31, angle=0):
+    """
+    应用运动模糊
+    
+    参数:
+        img: Image对象
+        length: 运动轨迹长度（像素）
+        angle: 运动方向角度（度）
+    
+    返回:
+        模糊后的Image对象
+    """
+    print(f"应用运动模糊: 长度 {length}, 角度 {angle}°")
+    return apply_convolution(img, create_motion_kernel(length, angle))
+
+
+def apply_lens_blur(img, radius=15):
+    """
+    应用镜头模糊（圆盘散焦）
+    
+    参数:
+        img: Image对象
+        radius: 散焦半径
+    
+    返回:
+        模糊后的Image对象
+    """
+    print(f"应用镜头模糊: 半径 {radius}")
+    return apply_convolution(img, create_disk_kernel(radius))
+
+
+# 精确双边滤波的计算量（窗口像素数 x 图像像素数）超过该值时自动改用网格近似
+_BILATERAL_EXACT_MAX_WORK = 5e7
+# 双边网格四周的留白格数，保证[1,4,6,4,1]模糊和三线性插值不越界
+_GRID_PAD = 2
+
+
+def _split_alpha(img):
+    """把图像拆成 (颜色数组HxWxC float32, alpha通道或None, 颜色模式)"""
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGB')
+    alpha = img.getchannel('A') if img.mode == 'RGBA' else None
+    color = img.convert('RGB') if img.mode == 'RGBA' else img
+    data = np.asarray(color, dtype=np.float32)
+    if color.mode == 'L':
+        data = data[:, :, np.newaxis]
+    return data, alpha, color.mode
+
+
+def _merge_alpha(data, alpha, mode):
+    """把滤波结果数组与原alpha通道重新组合成Image"""
+    result = np.clip(np.rint(data), 0, 255).astype(np.uint8)
+    if mode == 'L':
+        return Image.fromarray(result[:, :, 0], 'L')
+    out = Image.fromarray(result, 'RGB')
+    if alpha is not None:
+        out.putalpha(alpha)
+    return out
+
+
+def _bilateral_exact(data, radius, sigma_color, sigma_space):
+    """精确双边滤波：按窗口偏移向量化累加，值域权重查表（按颜色距离平方索引）"""
+    height, width, channels = data.shape
+    quantized = data.astype(np.int32)
+    padded = np.pad(quantized, ((radius, radius), (radius, radius), (0, 0)), mode='edge')
+    max_d2 = channels * 255 * 255
+    range_lut = np.exp(-np.arange(max_d2 + 1, dtype=np.float64)
+                       / (2.0 * sigma_color ** 2)).astype(np.float32)
+    
+    acc = np.zeros_like(data)
+    weight_sum = np.zeros((height, width), dtype=np.float32)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            dist2 = dy * dy + dx * dx
+            if dist2 > radius * radius:
+                continue
+            spatial = np.float32(np.exp(-dist2 / (2.0 * sigma_space ** 2)))
+            shifted = padded[radius + dy:radius + dy + height,
+                             radius + dx:radius + dx + width]
+            diff = shifted - quantized
+            weight = spatial * range_lut[np.einsum('ijk,ijk->ij', diff, diff)]
+            acc += weight[:, :, np.newaxis] * shifted
+            weight_sum += weight
+    return acc / weight_sum[:, :, np.newaxis]
+
+
+def _blur_grid_axis(grid, axis):
+    """沿网格的一个轴做 [1,4,6,4,1]/16 模糊（网格四周有留白，不需要回绕）"""
+    grid = np.moveaxis(grid, axis, 0)
+    result = 6.0 * grid
+    for shift, coef in ((1, 4.0), (2, 1.0)):
+        result[shift:] += coef * grid[:-shift]
+        result[:-shift] += coef * grid[shift:]
+    result *= 1.0 / 16.0
+    return np.moveaxis(result, 0, axis)
+
+
+def _bilateral_grid(data, guide, sigma_color, sigma_space, row_offset=0):
+    """
+    双边网格近似：按 (y/σs, x/σs, 亮度/σr) 降采样泼溅到三维网格，
+    在网格上模糊后再三线性插值切片回原分辨率，代价与半径无关
+    
+    网格的行按整幅图像中的绝对行号 (row_offset + y) 划分，
+    条带只要包含足够的上下文，结果就与整幅图像逐像素一致
+    """
+    height, width, channels = data.shape
+    pad = _GRID_PAD
+    # 行方向的格号和小数部分由绝对坐标计算，再减去整数的起始格号
+    rows = np.arange(row_offset, row_offset + height, dtype=np.float64) / sigma_space
+    first_cell = int(np.floor(rows[0]))
+    splat_y = (np.floor(rows + 0.5).astype(np.intp) - first_cell + pad)[:, np.newaxis]
+    y0 = (np.floor(rows).astype(np.intp) - first_cell + pad)[:, np.newaxis]
+    fy = (rows - np.floor(rows)).astype(np.float32)[:, np.newaxis]
+    gx = (np.arange(width, dtype=np.float32) / sigma_space + pad)[np.newaxis, :]
+    gz = guide / np.float32(sigma_color) + pad
+    shape = (int(splat_y[-1, 0]) + pad + 2, int(gx[0, -1]) + pad + 2,
+             int(255 / sigma_color) + 2 * pad + 2)
+    size = shape[0] * shape[1] * shape[2]
+    
+    # 泼溅：最近邻落格，用bincount累加（最后一个网格是齐次权重）
+    flat = ((splat_y * shape[1] + np.rint(gx).astype(np.intp)) * shape[2]
+            + np.rint(gz).astype(np.intp)).ravel()
+    grids = [np.bincount(flat, weights=data[:, :, c].ravel(), minlength=size)
+             for c in range(channels)]
+    grids.append(np.bincount(flat, minlength=size).astype(np.float64))
+    del flat
+    for c, grid in enumerate(grids):
+        grid = grid.astype(np.float32).reshape(shape)
+        for axis in range(3):
+            grid = _blur_grid_axis(grid, axis)
+        grids[c] = grid.ravel()
+    
+    # 切片：三线性插值，8个角点逐一累加
+    x0, z0 = np.floor(gx), np.floor(gz)
+    fx, fz = gx - x0, gz - z0
+    base = ((y0 * shape[1] + x0.astype(np.intp)) * shape[2] + z0.astype(np.intp))
+    sliced = np.zeros((channels + 1, height, width), dtype=np.float32)
+    for oy, wy in ((0, 1 - fy), (1, fy)):
+        for ox, wx in ((0, 1 - fx), (1, fx)):
+            for oz, wz in ((0, 1 - fz), (1, fz)):
+                weight = (wy * wx) * wz
+                index = base + ((oy * shape[1] + ox) * shape[2] + oz)
+                for c, grid in enumerate(grids):
+                    sliced[c] += weight * grid.take(index)
+    result = sliced[:channels] / np.maximum(sliced[channels], 1e-8)
+    return np.moveaxis(result, 0, -1)
+
+
+def _bilateral_method(radius, size):
+    """按窗口大小和图像尺寸为 method='auto' 选择 'exact' 或 'grid'"""
+    work = (2 * radius + 1) ** 2 * size[0] * size[1]
+    return 'exact' if work <= _BILATERAL_EXACT_MAX_WORK else 'grid'
+
+
+def apply_bilateral_filter(img, radius=5, sigma_color=30, sigma_space=None, method='auto',
+                           row_offset=0):
+    """
+    应用双边滤波（保边去噪）
+    
+    参数:
+        img: Image对象 (L/RGB/RGBA，alpha通道保持不变)
+        radius: 空间窗口半径（像素）
+        sigma_color: 值域标准差，颜色差异超过它的邻居权重迅速衰减
+        sigma_space: 空间标准差，默认为 radius / 2
+        method: 计算方式
+            'exact': 窗口内精确加权（值域权重查表），代价随半径平方增长
+            'grid': 双边网格近似（以亮度为值域），代价与半径无关
+            'auto': 根据窗口大小和图像尺寸自动选择
+        row_offset: img 在整幅图像中的起始行（流式处理条带时使网格与整幅图像对齐）
+    
+    返回:
+        滤波后的Image对象
+    """
+    if sigma_space is None:
+        sigma_space = max(radius / 2.0, 1.0)
+    if method == 'auto':
+        method = _bilateral_method(radius, img.size)
+    print(f"应用双边滤波: 半径 {radius}, σ颜色 {sigma_color}, σ空间 {sigma_space}, 方式 {method}")
+    
+    data, alpha, mode = _split_alpha(img)
+    if method == 'exact':
+        result = _bilateral_exact(data, radius, sigma_color, sigma_space)
+    elif method == 'grid':
+        guide = data[:, :, 0] if mode == 'L' else np.asarray(
+            Image.fromarray(data.astype(np.uint8), 'RGB').convert('L'), dtype=np.float32)
+        result = _bilateral_grid(data, guide, sigma_color, sigma_space, row_offset)
+    else:
+        raise ValueError(f"不支持的计算方式: {method}")
+    return _merge_alpha(result, alpha, mode)
+
+
+def _box_sum_axis(a, radius, axis):
+    """沿一个轴求 2r+1 窗口和（前缀和相减），返回 (窗口和, 窗口覆盖像素数)"""
+    n = a.shape[axis]
+    r = min(radius, n - 1)
+    prefix = np.cumsum(a, axis=axis, dtype=np.float64)
+    
+    def part(start=None, stop=None):
+        index = [slice(None)] * a.ndim
+        index[axis] = slice(start, stop)
+        return tuple(index)
+    
+    total = np.empty_like(prefix)
+    total[part(0, n - r)] = prefix[part(r, n)]
+    total[part(n - r, n)] = prefix[part(n - 1, n)]
+    total[part(r + 1, n)] -= prefix[part(0, n - r - 1)]
+    positions = np.arange(n)
+    count = np.minimum(positions + radius, n - 1) - np.maximum(positions - radius, 0) + 1
+    return total, count
+
+
+def _box_mean(a, radius):
+    """用积分图计算 (2r+1)x(2r+1) 窗口均值，边界处按实际覆盖像素数归一化"""
+    rows, row_count = _box_sum_axis(a, radius, 0)
+    total, col_count = _box_sum_axis(rows, radius, 1)
+    count = np.outer(row_count, col_count).reshape(a.shape[:2] + (1,) * (a.ndim - 2))
+    return (total / count).astype(np.float32)
+
+
+def apply_guided_filter(img, radius=8, eps=0.01, guide=None):
+    """
+    应用导向滤波（保边平滑，代价与半径无关）
+    
+    参数:
+        img: Image对象 (L/RGB/RGBA，alpha通道保持不变)
+        radius: 窗口半径
+        eps: 正则化系数（按 0-1 灰度范围计），越大越平滑
+        guide: 导向图像，默认每个通道以自身为导向；给定时转为灰度使用
+    
+    返回:
+        滤波后的Image对象
+    """
+    print(f"应用导向滤波: 半径 {radius}, eps {eps}")
+    data, alpha, mode = _split_alpha(img)
+    p = data / np.float32(255.0)
+    mean_p = _box_mean(p, radius)
+    if guide is None:
+        # 自导向时 I == p，协方差即方差
+        guide_i, mean_i = p, mean_p
+        cov_ip = var_i = _box_mean(p * p, radius) - mean_p * mean_p
+    else:
+        guide_i = np.asarray(guide.convert('L').resize(img.size),
+                             dtype=np.float32)[:, :, np.newaxis] / np.float32(255.0)
+        mean_i = _box_mean(guide_i, radius)
+        var_i = _box_mean(guide_i * guide_i, radius) - mean_i * mean_i
+        cov_ip = _box_mean(guide_i * p, radius) - mean_i * mean_p
+    
+    a = cov_ip / (var_i + np.float32(eps))
+    b = mean_p - a * mean_i
+    result = _box_mean(a, radius) * guide_i + _box_mean(b, radius)
+    return _merge_alpha(result * np.float32(255.0), alpha, mode)
+
+
 # 示例使用
 if __name__ == "__main__":
     print("=== Pillow 滤镜和效果示例 ===\n")
@@ -337,5 +803,26 @@ if __name__ == "__main__":
     unsharp = apply_unsharp_mask(test_img, radius=2, percent=150)
     save_image(unsharp, "output/27_unsharp_mask.png")
     
+    # 11. 大尺寸自定义卷积核
+    motion = apply_motion_blur(test_img, length=31, angle=30)
+    save_image(motion, "output/27a_motion_blur.png")
+    
+    lens = apply_lens_blur(test_img, radius=12)
+    save_image(lens, "output/27b_lens_blur.png")
+    
+    # 系数排列与 ImageFilter.Kernel 一致：上重下轻的非对称核，比较内部像素（Pillow 不处理最外一圈）
+    top_heavy = [4, 2, 1, 1, 1, 0, 0, 0, -1]
+    pillow_kernel = test_img.filter(ImageFilter.Kernel((3, 3), top_heavy, scale=sum(top_heavy)))
+    ours = apply_convolution(test_img, np.array(top_heavy).reshape(3, 3))
+    diff = np.abs(np.asarray(pillow_kernel, dtype=int) - np.asarray(ours, dtype=int))[1:-1, 1:-1]
+    print(f"与 ImageFilter.Kernel 最大差值（仅舍入差异）: {diff.max()}")
+    
+    # 12. 保边滤波
+    bilateral = apply_bilateral_filter(test_img, radius=5, sigma_color=30)
+    save_image(bilateral, "output/27c_bilateral.png")
+    
+    guided = apply_guided_filter(test_img, radius=8, eps=0.01)
+    save_image(guided, "output/27d_guided.png")
+    
     print("\n所有滤镜示例已完成！请查看 output/ 目录")
 
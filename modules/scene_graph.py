@@ -0,0 +1,185 @@
+"""
+场景图模块
+把 drawing 中的图形保存为带边界框的场景节点（保留模式绘图），
+图形变化时只重绘新旧边界框覆盖的脏矩形区域，更新代价与变化大小成正比
+"""
+
+from .drawing import Canvas, get_shape_bbox, translate_shape_params
+
+
+class SceneNode:
+    """
+    场景中的一个图形
+    
+    属性:
+        shape: 图形名（与 Canvas.draw_batch 的 'shape' 相同）
+        params: 图形参数字典
+        bbox: 图形覆盖的像素范围 (left, top, right, bottom)，right/bottom 不含
+    """
+    
+    def __init__(self, shape, params):
+        self.shape = shape
+        self.params = dict(params)
+        self.bbox = self._compute_bbox()
+    
+    def _compute_bbox(self):
+        return get_shape_bbox(self.shape, self.params)
+    
+    def translated_params(self, dx, dy):
+        """返回平移 (dx, dy) 之后的图形参数"""
+        return translate_shape_params(self.shape, self.params, dx, dy)
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class Scene:
+    """
+    保留模式的场景图
+    
+    背景图缓存为底图；节点增删改时记录脏矩形（新旧边界框），
+    render() 只在脏矩形内恢复底图并重绘与之相交的节点。
+    局部重绘时坐标整体平移，宽折线等由浮点运算生成的边缘
+    可能与整幅重绘有个别像素的取整差异。
+    
+    用法:
+        scene = Scene(background)
+        bar = scene.add('rectangle', xy=[10, 10, 60, 100], fill=(0, 128, 255), outline=None)
+        label = scene.add('text', position=(10, 110), text='CPU')
+        frame = scene.render()
+        scene.update(bar, xy=[10, 30, 60, 100])   # 只有柱子附近会被重绘
+        frame = scene.render()
+    """
+    
+    def __init__(self, background):
+        """
+        参数:
+            background: 背景图像（场景的底图，不会被修改）
+        """
+        self.base = background.copy()
+        self.frame = None
+        self.nodes = []
+        self._dirty = []
+    
+    @property
+    def size(self):
+        return self.base.size
+    
+    def _clip(self, box):
+        width, height = self.size
+        return (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+    
+    def _mark_dirty(self, box):
+        """记录脏矩形，与已有的重叠矩形合并"""
+        box = self._clip(box)
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return
+        merged = True
+        while merged:
+            merged = False
+            for i, other in enumerate(self._dirty):
+                if _intersects(box, other):
+                    box = _union(box, self._dirty.pop(i))
+                    merged = True
+                    break
+        self._dirty.append(box)
+    
+    def add(self, shape, **params):
+        """
+        添加图形节点（绘制在所有已有节点之上）
+        
+        参数:
+            shape: 图形名（line, rectangle, circle, ellipse, polygon, text 等）
+            **params: 图形参数（与 Canvas 对应方法相同）
+        
+        返回:
+            SceneNode 对象，用于之后的 update / remove
+        """
+        node = SceneNode(shape, params)
+        self.nodes.append(node)
+        self._mark_dirty(node.bbox)
+        return node
+    
+    def update(self, node, **params):
+        """
+        修改节点参数，旧边界框和新边界框都会被标记为脏区域
+        
+        参数:
+            node: add() 返回的节点
+            **params: 要修改的图形参数
+        """
+        self._mark_dirty(node.bbox)
+        node.params.update(params)
+        node.bbox = node._compute_bbox()
+        self._mark_dirty(node.bbox)
+    
+    def remove(self, node):
+        """移除节点，其边界框被标记为脏区域"""
+        self.nodes.remove(node)
+        self._mark_dirty(node.bbox)
+    
+    def _render_region(self, box):
+        """在底图的 box 区域上重绘所有与之相交的节点，写回当前帧"""
+        left, top = box[0], box[1]
+        canvas = Canvas(self.base.crop(box), in_place=True)
+        for node in self.nodes:
+            if _intersects(node.bbox, box):
+                getattr(canvas, node.shape)(**node.translated_params(-left, -top))
+        self.frame.paste(canvas.image, (left, top))
+    
+    def render(self, full=False):
+        """
+        渲染场景
+        
+        参数:
+            full: 是否强制整幅重绘
+        
+        返回:
+            当前帧图像（场景内部持有，下一次 render 会原地更新它）
+        """
+        if self.frame is None or full:
+            print(f"整幅渲染场景: {len(self.nodes)} 个节点")
+            canvas = Canvas(self.base)
+            for node in self.nodes:
+                getattr(canvas, node.shape)(**node.params)
+            self.frame = canvas.image
+        elif self._dirty:
+            area = sum((b[2] - b[0]) * (b[3] - b[1]) for b in self._dirty)
+            print(f"增量渲染场景: {len(self._dirty)} 个脏矩形, 共 {area} 像素")
+            for box in self._dirty:
+                self._render_region(box)
+        self._dirty = []
+        return self.frame
+
+
+# 示例使用（在项目根目录运行: python -m modules.scene_graph）
+if __name__ == "__main__":
+    print("=== Pillow 场景图示例 ===\n")
+    
+    import os
+    from .basic_operations import create_new_image, save_image
+    
+    os.makedirs("output", exist_ok=True)
+    
+    # 一个简单的仪表盘：三根柱子和标签
+    scene = Scene(create_new_image(600, 400, (255, 255, 255)))
+    scene.add('rectangle', xy=[0, 0, 600, 50], fill=(70, 130, 180), outline=None)
+    scene.add('text', position=(20, 12), text="Dashboard", fill=(255, 255, 255), font_size=24)
+    bars = []
+    for i, value in enumerate([120, 200, 160]):
+        x = 100 + i * 150
+        bars.append(scene.add('rectangle', xy=[x, 350 - value, x + 80, 350],
+                              fill=(52, 152, 219), outline=None))
+        scene.add('text', position=(x + 20, 360), text=f"Item {i + 1}", font_size=16)
+    save_image(scene.render(), "output/scene_frame1.png")
+    
+    # 只更新一根柱子，其余区域保持不变
+    scene.update(bars[1], xy=[250, 100, 330, 350], fill=(231, 76, 60))
+    save_image(scene.render(), "output/scene_frame2.png")
+    
+    print("\n场景图示例已完成！请查看 output/ 目录")
@@ -0,0 +1,333 @@
+"""
+流式滤镜模块
+逐条带读取超大图像（如十亿像素级切片扫描），只保留滤镜支撑范围所需的行，
+处理完一条就写出一条，峰值内存与 图像宽度 x 核高度 成正比
+"""
+
+import contextlib
+import io
+import math
+
+from PIL import Image
+
+from . import filters_effects as fe
+
+
+# filters_effects 中各邻域操作在垂直方向上需要的额外行数（光晕）
+# 值为 根据调用参数计算光晕的函数；逐点操作的光晕为 0
+def _gaussian_halo(radius=2, **kwargs):
+    # Pillow 的高斯模糊由三次方框模糊近似，支撑范围约为 3 x 半径
+    return 3 * math.ceil(radius) + 2
+
+
+def _unsupported(name):
+    def rule(**kwargs):
+        raise ValueError(f"{name} 依赖整幅图像的统计量，无法流式处理")
+    return rule
+
+
+def _bilateral_halo(radius=5, sigma_space=None, method='auto', **kwargs):
+    if method == 'exact':
+        return radius
+    # 网格近似的支撑范围：两格网格模糊加一格插值
+    sigma_space = sigma_space or max(radius / 2.0, 1.0)
+    return max(radius, math.ceil(4 * sigma_space))
+
+
+def _bilateral_strip_kwargs(kwargs, size, buffer_top):
+    # 按整幅图像尺寸只选择一次计算方式，网格近似按绝对行号对齐
+    kwargs = dict(kwargs)
+    if kwargs.get('method', 'auto') == 'auto':
+        kwargs['method'] = fe._bilateral_method(kwargs.get('radius', 5), size)
+    kwargs['row_offset'] = buffer_top
+    return kwargs
+
+
+def _guided_halo(radius=8, guide=None, **kwargs):
+    if guide is not None:
+        raise ValueError("流式导向滤波不支持外部导向图像")
+    # 两次方框均值叠加
+    return 2 * radius
+
+
+_HALO_RULES = {
+    fe.apply_blur: _gaussian_halo,
+    fe.apply_box_blur: lambda radius=2, **kwargs: math.ceil(radius),
+    fe.apply_sharpen: lambda **kwargs: 1,
+    fe.apply_edge_enhance: lambda **kwargs: 1,
+    fe.apply_find_edges: lambda **kwargs: 1,
+    fe.apply_contour: lambda **kwargs: 1,
+    fe.apply_emboss: lambda **kwargs: 1,
+    fe.apply_detail: lambda **kwargs: 1,
+    fe.adjust_brightness: lambda **kwargs: 0,
+    fe.adjust_contrast: _unsupported('adjust_contrast'),
+    fe.adjust_saturation: lambda **kwargs: 0,
+    fe.adjust_sharpness: lambda **kwargs: 1,
+    fe.apply_smooth: lambda **kwargs: 1,
+    fe.apply_smooth_more: lambda **kwargs: 2,
+    fe.apply_median_filter: lambda size=3, **kwargs: size // 2,
+    fe.apply_min_filter: lambda size=3, **kwargs: size // 2,
+    fe.apply_max_filter: lambda size=3, **kwargs: size // 2,
+    fe.apply_unsharp_mask: _gaussian_halo,
+    fe.apply_convolution: lambda kernel, **kwargs: len(kernel) // 2,
+    fe.apply_motion_blur: lambda length=31, **kwargs: (max(1, int(length)) | 1) // 2,
+    fe.apply_lens_blur: lambda radius=15, **kwargs: math.ceil(radius),
+    fe.apply_bilateral_filter: _bilateral_halo,
+    fe.apply_guided_filter: _guided_halo,
+}
+
+
+# 逐条带调用时需要按条带位置调整参数的滤镜：函数(参数, 整幅图像尺寸, 缓冲区起始行) -> 参数
+_STRIP_KWARGS = {
+    fe.apply_bilateral_filter: _bilateral_strip_kwargs,
+}
+
+
+def get_filter_halo(operation, **kwargs):
+    """
+    获取滤镜在垂直方向上需要的额外行数
+    
+    参数:
+        operation: filters_effects 中的函数
+        **kwargs: 调用该函数时的参数（不含img）
+    
+    返回:
+        上下各需多读的行数
+    """
+    if operation not in _HALO_RULES:
+        raise ValueError(f"未知滤镜 {getattr(operation, '__name__', operation)}，请显式指定 halo")
+    return _HALO_RULES[operation](**kwargs)
+
+
+class ImageStripSource:
+    """从内存中的Image按行读取条带（主要用于小图和对比验证）"""
+    
+    def __init__(self, img):
+        self.img = img
+        self.size = img.size
+        self.mode = img.mode
+    
+    def read_rows(self, top, bottom):
+        return self.img.crop((0, top, self.size[0], bottom))
+    
+    def close(self):
+        pass
+
+
+class FileStripSource:
+    """
+    直接从文件按行读取条带，不解码整幅图像
+    
+    支持像素以未压缩方式存储的格式（PPM/PGM、BMP、未压缩TIFF），
+    按 Pillow 解析出的 raw 数据块偏移量定位每一行
+    """
+    
+    def __init__(self, path):
+        # 只解析文件头，超大图像不应触发解压炸弹检查
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+        self.size = img.size
+        self.mode = img.mode
+        self._tiles = []
+        width = img.size[0]
+        for tile in img.tile:
+            codec, extents, offset, args = tile
+            if codec != 'raw' or extents[0] != 0 or extents[2] != width:
+                img.close()
+                raise ValueError(f"{path} 不是按整行未压缩存储的图像，无法流式读取")
+            if isinstance(args, str):
+                args = (args, 0, 1)
+            rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+            if stride <= 0:
+                stride = self._row_bytes(rawmode, width)
+            self._tiles.append((extents[1], extents[3], offset, rawmode, stride, ystep))
+        img.close()
+        self._file = open(path, 'rb')
+    
+    def _row_bytes(self, rawmode, width):
+        row = Image.new(self.mode, (width, 1))
+        try:
+            return len(row.tobytes('raw', rawmode))
+        except (ValueError, KeyError):
+            return len(row.tobytes())
+    
+    def read_rows(self, top, bottom):
+        strip = Image.new(self.mode, (self.size[0], bottom - top))
+        for tile_top, tile_bottom, offset, rawmode, stride, ystep in self._tiles:
+            y0, y1 = max(top, tile_top), min(bottom, tile_bottom)
+            if y0 >= y1:
+                continue
+            if ystep < 0:
+                # 自下而上存储（如BMP）：最后一行在文件最前面
+                first = tile_bottom - y1
+            else:
+                first = y0 - tile_top
+            self._file.seek(offset + first * stride)
+            data = self._file.read((y1 - y0) * stride)
+            part = Image.frombytes(self.mode, (self.size[0], y1 - y0), data,
+                                   'raw', rawmode, stride, ystep)
+            strip.paste(part, (0, y0 - top))
+        return strip
+    
+    def close(self):
+        self._file.close()
+
+
+class PNMStripWriter:
+    """把条带依次追加写入 PGM/PPM 文件（L模式写PGM，RGB模式写PPM）"""
+    
+    def __init__(self, path, size, mode):
+        if mode not in ('L', 'RGB'):
+            raise ValueError(f"PNM 流式输出只支持 L/RGB 模式，当前为 {mode}")
+        self.size = size
+        self.mode = mode
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        magic = b'P5' if mode == 'L' else b'P6'
+        self._file.write(magic + b'\n%d %d\n255\n' % size)
+    
+    def write(self, strip):
+        if strip.mode != self.mode:
+            strip = strip.convert(self.mode)
+        self._file.write(strip.tobytes())
+        self.rows_written += strip.height
+    
+    def close(self):
+        self._file.close()
+
+
+def open_strip_source(source):
+    """
+    打开条带数据源
+    
+    参数:
+        source: 文件路径或Image对象；不能流式读取的文件会整幅加载
+    
+    返回:
+        条带数据源对象（提供 size, mode, read_rows(top, bottom), close()）
+    """
+    if isinstance(source, Image.Image):
+        return ImageStripSource(source)
+    try:
+        return FileStripSource(source)
+    except ValueError as e:
+        print(f"警告: {e}，将整幅加载")
+        return ImageStripSource(Image.open(source))
+
+
+def iter_filtered_strips(source, operation, halo=None, strip_height=None, **kwargs):
+    """
+    逐条带应用滤镜，按顺序产出处理好的条带
+    
+    参数:
+        source: 条带数据源（见 open_strip_source）
+        operation: 滤镜函数，签名为 operation(img, **kwargs)
+        halo: 上下各需多读的行数，默认按 filters_effects 的函数自动推断
+        strip_height: 每次输出的行数，默认取 max(2*halo+1, 64)
+        **kwargs: 传给滤镜函数的参数
+    
+    返回:
+        生成器，依次产出 (起始行, 条带Image)
+    """
+    if halo is None:
+        halo = get_filter_halo(operation, **kwargs)
+    if strip_height is None:
+        strip_height = max(2 * halo + 1, 64)
+    width, height = source.size
+    adapt_kwargs = _STRIP_KWARGS.get(operation)
+    
+    # 滚动缓冲区：保存 [buffer_top, buffer_top + buffer.height) 的源行
+    buffer, buffer_top = None, 0
+    for top in range(0, height, strip_height):
+        bottom = min(top + strip_height, height)
+        need_top, need_bottom = max(top - halo, 0), min(bottom + halo, height)
+        if buffer is None:
+            buffer, buffer_top = source.read_rows(need_top, need_bottom), need_top
+        else:
+            # 复用上一条带已经读过的行，只读新增部分
+            kept = buffer.crop((0, need_top - buffer_top, width, buffer.height))
+            fresh = source.read_rows(buffer_top + buffer.height, need_bottom)
+            buffer = Image.new(kept.mode, (width, need_bottom - need_top))
+            buffer.paste(kept, (0, 0))
+            buffer.paste(fresh, (0, kept.height))
+            buffer_top = need_top
+        
+        # 滤镜函数每次调用都会打印日志，逐条带调用时静默
+        call_kwargs = adapt_kwargs(kwargs, source.size, buffer_top) if adapt_kwargs else kwargs
+        with contextlib.redirect_stdout(io.StringIO()):
+            filtered = operation(buffer, **call_kwargs)
+        yield top, filtered.crop((0, top - buffer_top, width, bottom - buffer_top))
+
+
+def stream_filter(input_path, output_path, operation, halo=None, strip_height=None, **kwargs):
+    """
+    流式地对超大图像文件应用滤镜，结果写入 PGM/PPM 文件
+    
+    参数:
+        input_path: 输入图像路径（PPM/PGM、BMP、未压缩TIFF 可真正流式读取），
+            只支持 L/RGB 图像（输出为 PGM/PPM，不能保存透明度）
+        output_path: 输出 PGM/PPM 路径
+        operation: filters_effects 中的滤镜函数（或自定义函数并指定halo）
+        halo: 上下各需多读的行数，默认自动推断
+        strip_height: 每个条带的行数
+        **kwargs: 传给滤镜函数的参数
+    
+    返回:
+        写出的总行数
+    """
+    name = getattr(operation, '__name__', str(operation))
+    print(f"流式滤镜: {input_path} -> {output_path}, 操作 {name}")
+    source = open_strip_source(input_path)
+    if source.mode not in ('L', 'RGB'):
+        source.close()
+        raise ValueError(f"流式滤镜只支持 L/RGB 图像（输出为 PGM/PPM），{input_path} 为 {source.mode} 模式，"
+                         f"请先转换为 RGB 或 L")
+    writer = None
+    try:
+        for top, strip in iter_filtered_strips(source, operation, halo, strip_height, **kwargs):
+            if writer is None:
+                writer = PNMStripWriter(output_path, source.size, strip.mode)
+            writer.write(strip)
+    finally:
+        source.close()
+        if writer is not None:
+            writer.close()
+    rows = writer.rows_written if writer is not None else 0
+    print(f"流式滤镜完成: {rows} 行")
+    return rows
+
+
+# 示例使用（在项目根目录运行: python -m modules.streaming）
+if __name__ == "__main__":
+    print("=== Pillow 流式滤镜示例 ===\n")
+    
+    import os
+    from .basic_operations import create_gradient_image
+    
+    os.makedirs("output", exist_ok=True)
+    
+    # 先写出一个未压缩的PPM作为"超大图像"的替身
+    create_gradient_image(800, 600).save("output/stream_input.ppm")
+    
+    stream_filter("output/stream_input.ppm", "output/stream_blur.ppm",
+                  fe.apply_blur, radius=5, strip_height=32)
+    stream_filter("output/stream_input.ppm", "output/stream_median.ppm",
+                  fe.apply_median_filter, size=5)
+    stream_filter("output/stream_input.ppm", "output/stream_bilateral.ppm",
+                  fe.apply_bilateral_filter, radius=9, sigma_color=20, method='grid', strip_height=32)
+    
+    # 逐条带结果与整幅图像处理逐像素一致（双边网格按绝对行号对齐）
+    whole_input = Image.open("output/stream_input.ppm")
+    for name, operation, kwargs in [("stream_blur", fe.apply_blur, dict(radius=5)),
+                                    ("stream_bilateral", fe.apply_bilateral_filter,
+                                     dict(radius=9, sigma_color=20, method='grid'))]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            whole = operation(whole_input, **kwargs)
+        streamed = Image.open(f"output/{name}.ppm")
+        print(f"{name} 与整幅处理一致: {whole.tobytes() == streamed.tobytes()}")
+    
+    print("\n流式滤镜示例已完成！请查看 output/ 目录")
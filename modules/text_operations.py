@@ -3,11 +3,32 @@
 包含添加文字水印、多行文字、文字居中等功能
 """
 
+import math
+
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    from .composition import composite_region
+except ImportError:  # 直接作为脚本运行
+    from composition import composite_region
+
+
+def _overlay_box(img, box, anchor):
+    """
+    叠加层覆盖的区域（裁剪到图像内）
+    
+    左上角取不超过 anchor 的非负整数，平移后文字坐标的小数部分和符号不变，
+    绘制结果与在整幅图层上绘制相同
+    """
+    left = max(0, math.floor(min(box[0], anchor[0])))
+    top = max(0, math.floor(min(box[1], anchor[1])))
+    right = min(img.width, math.ceil(box[2]))
+    bottom = min(img.height, math.ceil(box[3]))
+    return left, top, right, bottom
+
 
 def add_text_watermark(img, text, position='bottom-right', font_size=20, 
-                       color=(255, 255, 255), opacity=128):
+                       color=(255, 255, 255), opacity=128, in_place=False):
     """
     添加文字水印
     
@@ -18,21 +39,15 @@ def add_text_watermark(img, text, position='bottom-right', font_size=20,
         font_size: 字体大小
         color: 文字颜色
         opacity: 不透明度 (0-255)
+        in_place: 是否直接修改原图（RGB/RGBA 图像不复制整幅图像，代价只与水印大小有关）
     
     返回:
         添加水印后的图像
     """
     print(f"添加文字水印: '{text}' 在 {position}")
     
-    # 创建RGBA图像用于透明度
-    if img.mode != 'RGBA':
-        img_rgba = img.convert('RGBA')
-    else:
-        img_rgba = img.copy()
-    
-    # 创建透明图层
-    txt_layer = Image.new('RGBA', img_rgba.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(txt_layer)
+    # 只用于测量文字的临时画布
+    draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
     
     # 获取字体
     try:
@@ -50,30 +65,34 @@ def add_text_watermark(img, text, position='bottom-right', font_size=20,
     if position == 'top-left':
         xy = (margin, margin)
     elif position == 'top-right':
-        xy = (img_rgba.width - text_width - margin, margin)
+        xy = (img.width - text_width - margin, margin)
     elif position == 'bottom-left':
-        xy = (margin, img_rgba.height - text_height - margin)
+        xy = (margin, img.height - text_height - margin)
     elif position == 'bottom-right':
-        xy = (img_rgba.width - text_width - margin, 
-              img_rgba.height - text_height - margin)
+        xy = (img.width - text_width - margin, 
+              img.height - text_height - margin)
     elif position == 'center':
-        xy = ((img_rgba.width - text_width) // 2,
-              (img_rgba.height - text_height) // 2)
+        xy = ((img.width - text_width) // 2,
+              (img.height - text_height) // 2)
     else:
         xy = position  # 直接使用元组坐标
     
+    # 只创建覆盖文字区域的透明图层，合成代价与水印大小成正比
+    # （RGB 图像保持 RGB，其他模式与原先一样转为 RGBA）
+    if img.mode not in ('RGB', 'RGBA'):
+        img, in_place = img.convert('RGBA'), True
+    left, top, right, bottom = _overlay_box(img, draw.textbbox(xy, text, font=font), xy)
+    if left >= right or top >= bottom:
+        return img if in_place else img.copy()
+    txt_layer = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+    
     # 绘制文字（带透明度）
     color_with_alpha = (*color[:3], opacity)
-    draw.text(xy, text, font=font, fill=color_with_alpha)
+    ImageDraw.Draw(txt_layer).text((xy[0] - left, xy[1] - top), text, font=font,
+                                   fill=color_with_alpha)
     
     # 合成图层
-    result = Image.alpha_composite(img_rgba, txt_layer)
-    
-    # 如果原图不是RGBA，转回RGB
-    if img.mode == 'RGB':
-        result = result.convert('RGB')
-    
-    return result
+    return composite_region(img, txt_layer, (left, top), in_place)
 
 
 def add_centered_text(img, text, font_size=40, color=(0, 0, 0)):
@@ -166,14 +185,8 @@ def add_text_with_background(img, text, position, font_size=20,
     """
     print(f"添加带背景的文字: '{text}'")
     
-    if img.mode != 'RGBA':
-        img_rgba = img.convert('RGBA')
-    else:
-        img_rgba = img.copy()
-    
-    # 创建透明图层
-    txt_layer = Image.new('RGBA', img_rgba.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(txt_layer)
+    # 只用于测量文字的临时画布
+    draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
     
     try:
         font = ImageFont.truetype("Arial.ttf", font_size)
@@ -192,19 +205,27 @@ def add_text_with_background(img, text, position, font_size=20,
         position[0] + text_width + padding,
         position[1] + text_height + padding
     ]
+    
+    # 透明图层只覆盖背景矩形和文字（RGB 图像保持 RGB，其他模式转为 RGBA）
+    result = img.copy() if img.mode in ('RGB', 'RGBA') else img.convert('RGBA')
+    text_bbox = draw.textbbox(position, text, font=font)
+    left, top, right, bottom = _overlay_box(result, (
+        min(bg_bbox[0], text_bbox[0]), min(bg_bbox[1], text_bbox[1]),
+        max(bg_bbox[2] + 1, text_bbox[2]), max(bg_bbox[3] + 1, text_bbox[3])), position)
+    if left >= right or top >= bottom:
+        return result
+    txt_layer = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+    layer_draw = ImageDraw.Draw(txt_layer)
+    
     bg_color_with_alpha = (*bg_color[:3], bg_opacity)
-    draw.rectangle(bg_bbox, fill=bg_color_with_alpha)
+    layer_draw.rectangle([bg_bbox[0] - left, bg_bbox[1] - top, bg_bbox[2] - left, bg_bbox[3] - top],
+                         fill=bg_color_with_alpha)
     
     # 绘制文字
-    draw.text(position, text, font=font, fill=text_color)
+    layer_draw.text((position[0] - left, position[1] - top), text, font=font, fill=text_color)
     
     # 合成图层
-    result = Image.alpha_composite(img_rgba, txt_layer)
-    
-    if img.mode == 'RGB':
-        result = result.convert('RGB')
-    
-    return result
+    return composite_region(result, txt_layer, (left, top), in_place=True)
 
 
 def add_outlined_text(img, text, position, font_size=40, 
@@ -336,6 +357,11 @@ if __name__ == "__main__":
                                      position='top-left', font_size=15)
     save_image(watermark_tl, "output/66_watermark_tl.png")
     
+    # 原地添加水印：只合成文字覆盖的区域，不复制整幅图像
+    stamped = test_img.copy()
+    add_text_watermark(stamped, "In place", position='top-right', font_size=15, in_place=True)
+    save_image(stamped, "output/66_watermark_in_place.png")
+    
     # 2. 居中文字
     centered = add_centered_text(test_img, "CENTERED TEXT", 
                                 font_size=50, color=(255, 255, 255))